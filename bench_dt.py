@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Usage: bench_dt.py
+    [--dt DT...]
+    [--ref_dt REF]
+    [--method METHOD...]
+    [-t T]
+    [-p P]
+    [-q Q]
+    [--sigma SIGMA]
+    [-n N]
+    [--seg SEG]
+    [--fmin FMIN]
+    [--fmax FMAX]
+    [--tol TOL]
+    [--seed SEED]
+
+Benchmark the accuracy of the WC integration schemes (`wc.METHODS`)
+as dt grows.
+
+N seeded runs of the `ie` model are simulated for each scheme and dt,
+and the largest peak of their mean PSD is fit (`spectral.peaks`). Its
+frequency and width (sqrt(2) times the Gaussian's std dev) are
+compared to those of a reference, simulated with Heun at a fine dt.
+For each scheme the largest dt whose errors are both within TOL is
+reported.
+
+Welch segments are SEG seconds long at any dt, so all PSDs have the
+same frequency resolution. Runs at different dt draw different noise,
+so with few runs (or short ones) the errors have a noise floor. The
+band should hold the reference's peak, and be below the Nyquist
+frequency of the largest dt.
+
+    Options:
+        -h --help        show this screen
+        --dt DT          time steps [default: 5e-3 4e-3 2e-3 1e-3 5e-4 2.5e-4]
+        --ref_dt REF     the reference's time step (s) [default: 1e-4]
+        --method METHOD  schemes [default: euler heun]
+        -t T             run time (s) [default: 20]
+        -p P             E drive [default: 2]
+        -q Q             I drive [default: 1]
+        --sigma SIGMA    population noise [default: 1e-2]
+        -n N             number of runs [default: 10]
+        --seg SEG        Welch segment length (s) [default: 1]
+        --fmin FMIN      lowest frequency of the peak band [default: 10]
+        --fmax FMAX      highest frequency of the peak band [default: 90]
+        --tol TOL        largest relative error [default: 0.05]
+        --seed SEED      seed of the first run [default: 42]
+"""
+from __future__ import division, print_function
+
+import time
+
+from docopt import docopt
+import numpy as np
+
+import drives
+import wc
+from spectral import peaks
+
+
+def _peak(t, P, Q, sigma, seeds, dt, method, seg, fmin, fmax):
+    """The center and width of the largest peak of the runs' mean PSD,
+    and the time the runs took."""
+    t0 = time.time()
+    freqs, psds = wc.record(
+        t, [drives.Constant(P)], Q, dt=dt, sigmas=sigma, seeds=seeds,
+        nperseg=int(np.round(seg / dt)), method=method)
+    elapsed = time.time() - t0
+
+    # The runs are samples of one process, so their mean PSD is the
+    # better estimate
+    table = peaks(freqs, psds.mean(0), fmin=fmin, fmax=fmax)
+    if np.all(np.isnan(table['power'])):
+        return np.nan, np.nan, elapsed
+
+    largest = np.nanargmax(table['power'][0])
+
+    return table['center'][0, largest], table['width'][0, largest], elapsed
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv=argv, version='alpha')
+
+    # docopt gives a default as one string
+    dts = sorted((float(dt) for arg in args['--dt'] for dt in arg.split()),
+                 reverse=True)
+    methods = [m for arg in args['--method'] for m in arg.split()]
+    ref_dt = float(args['--ref_dt'])
+
+    t = float(args['-t'])
+    P = float(args['-p'])
+    Q = float(args['-q'])
+    sigma = float(args['--sigma'])
+    n = int(args['-n'])
+    seg = float(args['--seg'])
+    fmin = float(args['--fmin'])
+    fmax = float(args['--fmax'])
+    tol = float(args['--tol'])
+
+    seed = int(args['--seed'])
+    seeds = np.arange(seed, seed + n)
+
+    # -
+    pars = (t, P, Q, sigma, seeds)
+    band = (seg, fmin, fmax)
+
+    c_ref, w_ref, t_ref = _peak(*(pars + (ref_dt, 'heun') + band))
+    print("reference (heun, dt = {}): center {:.3f} Hz, width {:.3f} Hz, "
+          "{:.1f} s".format(ref_dt, c_ref, w_ref, t_ref))
+
+    print("{:>6} {:>8} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+        "method", "dt", "time (s)", "center", "width", "center err",
+        "width err"))
+    best = {}
+    for method in methods:
+        for dt in dts:
+            c, w, elapsed = _peak(*(pars + (dt, method) + band))
+            c_err = abs(c - c_ref) / c_ref
+            w_err = abs(w - w_ref) / w_ref
+
+            print("{:>6} {:>8.1e} {:>8.2f} {:>10.3f} {:>10.3f} {:>10.3f} "
+                  "{:>10.3f}".format(method, dt, elapsed, c, w, c_err, w_err))
+
+            if c_err <= tol and w_err <= tol and method not in best:
+                best[method] = dt
+
+    print("largest dt within {:.0%}:".format(tol))
+    for method in methods:
+        print("{:>6} {}".format(method, best.get(method, "none")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Usage: bench_peaks.py
+    [-n N...]
+    [--mpd MPD]
+    [--kpsh]
+    [--max_ref MAX]
+    [--seed SEED]
+
+Benchmark minimum peak distance (mpd) suppression in
+`util.detect_peaks`, on noisy sine waves.
+
+For sizes up to MAX the old O(P^2) algorithm is timed too, and the
+two outputs are checked to be identical.
+
+    Options:
+        -h --help       show this screen
+        -n N            number of samples [default: 100000 1000000 10000000]
+        --mpd MPD       minimum peak distance [default: 20]
+        --kpsh          keep peaks with the same height
+        --max_ref MAX   largest size to run the old algorithm [default: 100000]
+        --seed SEED     random seed [default: 42]
+"""
+from __future__ import division, print_function
+
+import time
+
+from docopt import docopt
+import numpy as np
+
+from util import detect_peaks
+
+
+def _min_distance_ref(x, ind, mpd, kpsh):
+    """The original, O(P^2), mpd suppression."""
+    ind = ind[np.argsort(x[ind])][::-1]  # sort ind by peak height
+    idel = np.zeros(ind.size, dtype=bool)
+    for i in range(ind.size):
+        if not idel[i]:
+            # keep peaks with the same height if kpsh is True
+            idel = idel | (ind >= ind[i] - mpd) & (ind <= ind[i] + mpd) \
+                & (x[ind[i]] > x[ind] if kpsh else True)
+            idel[i] = 0  # Keep current peak
+
+    return np.sort(ind[~idel])
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv=argv, version='alpha')
+
+    # docopt gives a default as one string
+    sizes = [int(n) for arg in args['-n'] for n in arg.split()]
+    mpd = int(args['--mpd'])
+    kpsh = args['--kpsh']
+    max_ref = int(args['--max_ref'])
+
+    prng = np.random.RandomState(int(args['--seed']))
+
+    print("{:>10} {:>10} {:>10} {:>10}".format("n", "peaks", "new (s)",
+                                               "old (s)"))
+    for n in sizes:
+        x = np.sin(2 * np.pi * 5 * np.linspace(0, n / 1000, n))
+        x += prng.normal(0, 0.2, n)
+
+        ind = detect_peaks(x)
+
+        t0 = time.time()
+        new = detect_peaks(x, mpd=mpd, kpsh=kpsh)
+        t_new = time.time() - t0
+
+        t_old = np.nan
+        if n <= max_ref:
+            t0 = time.time()
+            old = _min_distance_ref(x, ind, mpd, kpsh)
+            t_old = time.time() - t0
+
+            if not np.array_equal(new, old):
+                raise ValueError("Peaks differ for n = {}".format(n))
+
+        print("{:>10} {:>10} {:>10.3f} {:>10.3f}".format(n, ind.size, t_new,
+                                                       t_old))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""A content-addressed, on disk, cache of model runs.
+
+A run's key is a hash of the model's name, its full set of parameters
+(its parsed command line, less NAME), and the code version (a hash of
+the source of every module of this package). Changing any parameter,
+the seed, or the code gives a new key, so stale results are never
+returned.
+
+    cache = Cache('data/cache', max_size=10e9)
+    key = cache.key(mixie, args)
+    results = cache.get(key)
+    if results is None:
+        results = mixie.main(argv, save=False)
+        cache.put(key, results)
+
+Only runs with a seed are reproducible, so only those should be cached
+(see `cacheable`). When the cache grows past `max_size` bytes the least
+recently used runs are removed.
+"""
+from __future__ import division, print_function
+
+import os
+import pickle
+import hashlib
+import tempfile
+
+_versions = {}
+
+
+def code_version(module):
+    """A hash of the source of every module of `module`'s package (i.e.
+    of the `.py` files in its directory).
+
+    All of them are hashed, not only those `module` imports, as a
+    model may import a module only when it needs it (e.g. `wcnet`, for
+    the Brian2 backend).
+    """
+    root = os.path.dirname(os.path.abspath(module.__file__))
+
+    h = hashlib.sha1()
+    for fname in sorted(os.listdir(root)):
+        if not fname.endswith('.py'):
+            continue
+        h.update(fname.encode())
+        with open(os.path.join(root, fname), 'rb') as fi:
+            h.update(fi.read())
+
+    return h.hexdigest()
+
+
+def cacheable(args):
+    """Is a run with (docopt) `args` reproducible, i.e. seeded?"""
+    return args.get('--seed') is not None
+
+
+class Cache(object):
+    """A directory of pickled run results, keyed by their parameters.
+
+    Parameters
+    ----------
+    path : str
+        the cache directory; it is created if needed.
+    max_size : {None, number}, optional (default = None)
+        the largest total size (bytes) of the cache. After each `put`
+        the least recently used runs are removed until it fits. None
+        never removes runs.
+
+    Notes
+    -----
+    Runs are written to a temporary file and then renamed, so many
+    processes can share one cache.
+    """
+
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _path(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def key(self, model, args):
+        """The key of a run of `model` with (docopt) `args`.
+
+        Parameters
+        ----------
+        model : module
+            the model.
+        args : dict
+            the model's parsed command line. NAME (where the results
+            are saved) is not part of the key.
+
+        Returns
+        -------
+        key : str
+        """
+        name = model.__name__
+        if name not in _versions:
+            _versions[name] = code_version(model)
+
+        params = sorted((k, repr(v)) for k, v in args.items() if k != 'NAME')
+
+        h = hashlib.sha1()
+        h.update(repr((name, params, _versions[name])).encode())
+
+        return h.hexdigest()
+
+    def get(self, key):
+        """The results of run `key`, or None if it is not cached."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fi:
+                results = pickle.load(fi)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Mark it as used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return results
+
+    def put(self, key, results):
+        """Cache the `results` of run `key`."""
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fo:
+                pickle.dump(results, fo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size):
+        """Remove the least recently used runs until the cache is no
+        bigger than `max_size` bytes."""
+        entries = []
+        for fname in os.listdir(self.path):
+            if not fname.endswith('.pkl'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, fname))
+            except OSError:
+                continue  # removed by another process
+            entries.append((st.st_mtime, st.st_size, fname))
+
+        size = sum(e[1] for e in entries)
+        for _, fsize, fname in sorted(entries):
+            if size <= max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, fname))
+            except OSError:
+                pass
+            size -= fsize
@@ -10,6 +10,14 @@
     [--seed SEED]
     [--min_P MP]
     [--sigma SIGMA]
+    [--backend BACKEND]
+    [--welch NPERSEG]
+    [--stride STRIDE]
+    [--decimate FACTOR]
+    [--record VARS]
+    [--burn T]
+    [--float32]
+    [--method METHOD]
 
 Wilcon-Cowan EI model, where the oscillation frequency drifts
 with time.
@@ -27,6 +35,18 @@ with time.
         --seed SEED random seed
         --min_P MP  smallest P possible [default: 1]
         --sigma SIGMA  Population noise [default: 1e-2]
+        --backend BACKEND  simulation engine, numpy or brian2 [default: brian2]
+        --welch NPERSEG  stream the run, keeping the PSD of the lfp, and
+                         traces only with --stride or --decimate (numpy
+                         backend)
+        --stride STRIDE  keep every STRIDEth sample of the traces
+        --decimate FACTOR  keep every FACTORth sample, after an
+                           anti-aliasing filter
+        --record VARS    traces to keep, of E,I,lfp [default: E,I,lfp]
+        --burn T         drop the first T seconds [default: 0]
+        --float32        keep the traces as float32
+        --method METHOD  integration scheme, euler or heun (numpy backend)
+                         [default: euler]
 """
 from __future__ import division, print_function
 
@@ -34,8 +54,8 @@ from docopt import docopt
 import numpy as np
 from pykdf.kdf import save_kdf
 
-from brian2 import *
-from fakespikes import rates
+import drives
+import wc
 
 
 def ie(t,
@@ -48,58 +68,21 @@ def ie(t,
        Q=1,
        dt=1e-3,
        min_P=1,
-       sigma=0.01):
-    # --
-    time = t * second
-    time_step = dt * second
-
-    # -
-    # Fixed parameters.
-    re = 1.0
-    ri = 0.5
-
-    kn = 1.0
-    k = 1.0
-
-    tau_e = 5 * msecond
-    tau_i = 10 * msecond
-
+       sigma=0.01,
+       seed=None,
+       **options):
+    """Run the model; `options` and the results are as for
+    `wc.run_model`."""
     # -
     # Define the drifting drive
-    times = rates.create_times(t, dt)
-    P = rates.stim(times, P, drift)
-    P[P < min_P] = min_P
-
-    # Scale it
-    P = P * (2** -0.03)
-
-    # Format for Brian2
-    P = TimedArray(P, dt=time_step)
-
-    # -
-    eqs = """
-            dE/dt = -E/tau_e + ((1 - re * E) * (1 / (1 + exp(-(k * c1 * E - k * c2 * I+ k * P(t) - 2))) - 1/(1 + exp(2*1.0)))) / tau_e  + (sigma / tau_e**.5 * xi_e) : 1
-            dI/dt = -I/tau_i + ((1 - ri * I) * (1 / (1 + exp(-2 * (kn * c3 * E - kn * c4 * I + kn * Q - 2.5))) - 1/(1 + exp(2*2.5)))) / tau_i + (sigma / tau_i**.5 * xi_i) : 1
-        """
-
-    pops = NeuronGroup(1, model=eqs, namespace={'Q': Q})
-    pops.E = 0
-    pops.I = 0
+    drive = drives.Drift(P, drift, min_P, seed=seed)
 
-    # --
-    # Record
-    mon = StateMonitor(pops, ('E', 'I'), record=True)
+    return wc.run_model(
+        t, drive, Q, c1, c2, c3, c4, dt=dt, sigma=sigma, seed=seed, **options)
 
-    # --
-    # Run
-    defaultclock.dt = time_step
-    run(time)
 
-    return mon.I.flatten(), mon.E.flatten()
-
-
-if __name__ == "__main__":
-    args = docopt(__doc__, version='alpha')
+def main(argv=None, save=True):
+    args = docopt(__doc__, argv=argv, version='alpha')
 
     try:
         seed = int(args['--seed'])
@@ -124,19 +107,23 @@ if __name__ == "__main__":
     sigma = float(args['--sigma'])
 
     # -
-    # Run model
-    I, E = ie(t, P, d, min_P=min_P, sigma=sigma)
-    lfp = (E + I)
-
-    # -
-    save_kdf(
-        str(args['NAME']),
-        E=E,
-        I=I,
-        lfp=lfp,
+    results = dict(
         t=t,
         dt=dt,
         P=P,
         Q=Q,
         d=d,
         sigma=sigma)
+    results.update(ie(t, P, d, dt=dt, min_P=min_P, sigma=sigma, seed=seed,
+                      **wc.cli_options(args)))
+    if seed is not None:
+        results['seed'] = seed
+
+    if save:
+        save_kdf(str(args['NAME']), **results)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
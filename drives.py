@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Drives to E, for the Wilson-Cowan models.
+
+The WC models differ only in their drive to E, P(t). Each drive here
+is an object that makes that P(t) for a run time and dt, so one engine
+(`wc.ensemble` or `wcnet.Simulator`) can run any of them, or any mix
+of them in one batch:
+
+    Ps = [Pulse(2, 1, 0.1), Drift(2, 0.01), Ramp(0.5, 2), Constant(2)]
+    I, E = wc.ensemble(3, Ps, 1, seeds=[1, 2, 3, 4])
+
+As in the models, a drive's P is scaled by `SCALE`.
+
+Engines don't need a whole batch's drive at once. A `Batch` makes it a
+block of steps at a time, as the integration reaches them, so drive
+memory is `(n_runs, chunk)` not `(n_runs, n_steps)`. Constant, pulse
+and ramp drives are closed form, and are computed for all the runs of
+a kind at once, from arrays of their parameters. Drifts are random
+walks, made forward as they are needed.
+"""
+from __future__ import division, print_function
+
+import numpy as np
+from fakespikes import rates
+
+import rng
+
+SCALE = 2**-0.03
+
+
+class Drive(object):
+    """A drive to E. Subclasses define `values(t, dt)`, the unscaled
+    drive at each time step.
+
+    For a `Batch`, subclasses with a closed form also define `_params`
+    and `_block`, the drive of a group of them at any steps. By default
+    each drive is made in full, once.
+    """
+    scale = SCALE
+
+    def __call__(self, t, dt):
+        """The (scaled) drive, for a run of `t` seconds in steps of
+        `dt`. Like a Brian2 TimedArray, engines hold the last value
+        past its end, so constant drives are one value long."""
+        return np.atleast_1d(self.values(t, dt)) * self.scale
+
+    def values(self, t, dt):
+        raise NotImplementedError()
+
+    @classmethod
+    def _params(cls, group, t, dt):
+        """The parameters of a `group` of drives of this kind, as a
+        dict of arrays (one value per drive). `m` is the length of each
+        drive."""
+        values = [np.atleast_1d(d.values(t, dt)) for d in group]
+
+        return dict(m=np.array([v.size for v in values]), values=values)
+
+    @classmethod
+    def _block(cls, params, k):
+        """The unscaled drive of a group at steps `k`, `(n_group, n)`.
+        Each row of `k` is already clipped to that drive's length."""
+        return np.array([v[kk] for v, kk in zip(params['values'], k)])
+
+
+class Constant(Drive):
+    """A constant drive, P (as in `ie` and `mixie`)."""
+
+    def __init__(self, P):
+        self.P = P
+
+    def values(self, t, dt):
+        return np.array([self.P], dtype='float64')
+
+    @classmethod
+    def _params(cls, group, t, dt):
+        return dict(
+            m=np.ones(len(group), dtype=int),
+            P=np.array([d.P for d in group], dtype='float64'))
+
+    @classmethod
+    def _block(cls, params, k):
+        return np.broadcast_to(params['P'][:, None], k.shape)
+
+
+class Pulse(Drive):
+    """A burst of drive P, from `t_burst` for `w` seconds, and `min_P`
+    otherwise (as in `burstie`)."""
+
+    def __init__(self, P, t_burst, w, min_P=0):
+        self.P = P
+        self.t_burst = t_burst
+        self.w = w
+        self.min_P = min_P
+
+    def values(self, t, dt):
+        times = rates.create_times(t, dt)
+        return rates.square_pulse(
+            times, self.P, self.t_burst, self.w, dt, min_a=self.min_P)
+
+    @classmethod
+    def _params(cls, group, t, dt):
+        # The steps the burst starts and stops at are taken from one
+        # `square_pulse`, so they match it exactly. Only they are kept.
+        m, on, off = [], [], []
+        for d in group:
+            v = d.values(t, dt)
+            i = np.flatnonzero(v != d.min_P)
+            m.append(v.size)
+            on.append(i[0] if i.size else 0)
+            off.append(i[-1] + 1 if i.size else 0)
+
+        return dict(
+            m=np.array(m),
+            on=np.array(on)[:, None],
+            off=np.array(off)[:, None],
+            P=np.array([d.P for d in group], dtype='float64')[:, None],
+            min_P=np.array([d.min_P for d in group], dtype='float64')[:, None])
+
+    @classmethod
+    def _block(cls, params, k):
+        burst = np.logical_and(k >= params['on'], k < params['off'])
+
+        return np.where(burst, params['P'], params['min_P'])
+
+
+class Drift(Drive):
+    """A drive that starts at P and drifts randomly, by `drift`, but
+    never below `min_P` (as in `driftie`).
+
+    The drift is a random walk, with normal steps of std dev `drift`,
+    drawn from stream `(pop, DRIVE)` of `seed` (see `rng`). The walk
+    is clipped at `min_P`, but carries on from where it would be
+    unclipped.
+    """
+
+    def __init__(self, P, drift, min_P=1, seed=None, pop=0):
+        self.P = P
+        self.drift = drift
+        self.min_P = min_P
+        self.seed = seed
+        self.pop = pop
+
+        # Kept, so that even with no seed the drive is the same each
+        # time it is made
+        self._seq = rng.spawn(seed, pop, rng.DRIVE)
+
+    def values(self, t, dt):
+        m = len(rates.create_times(t, dt))
+        return _Walk([self])(0, m)[0]
+
+    @classmethod
+    def _params(cls, group, t, dt):
+        m = len(rates.create_times(t, dt))
+
+        return dict(m=np.full(len(group), m), walk=_Walk(group))
+
+    @classmethod
+    def _block(cls, params, k):
+        # Each row of k is the same run of steps
+        walk = params['walk'](k.min(), k.max() + 1)
+
+        return walk[:, k[0] - k.min()]
+
+
+class _Walk(object):
+    """The walks of a group of `Drift`s, made forward a block of steps
+    at a time.
+
+    Only the steps from the start of the last block asked for are kept,
+    so blocks should be asked for in order (each may start again inside
+    the one before). An earlier block starts the walks over.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self.rewind()
+
+    def rewind(self):
+        self.prngs = [np.random.Generator(np.random.PCG64(d._seq))
+                      for d in self.group]
+        self.i0 = 0
+        self.P = np.array([[d.P] for d in self.group], dtype='float64')
+
+    def __call__(self, i0, i1):
+        """The (clipped) walks at steps `i0` to `i1`, `(n_group, n)`."""
+        if i0 < self.i0:
+            self.rewind()
+
+        # Step on from the last (unclipped) value
+        n = i1 - (self.i0 + self.P.shape[1])
+        if n > 0:
+            steps = np.array([prng.normal(0, d.drift, n)
+                              for prng, d in zip(self.prngs, self.group)])
+            walk = np.cumsum(np.hstack([self.P[:, -1:], steps]), axis=1)
+            self.P = np.hstack([self.P, walk[:, 1:]])
+
+        self.P = self.P[:, i0 - self.i0:]
+        self.i0 = i0
+
+        min_P = np.array([[d.min_P] for d in self.group])
+        return np.maximum(self.P[:, :i1 - i0], min_P)
+
+
+class Ramp(Drive):
+    """A drive that slides linearly from P0 to PN (as in `slidie`)."""
+
+    def __init__(self, P0, PN):
+        self.P0 = P0
+        self.PN = PN
+
+    def values(self, t, dt):
+        times = rates.create_times(t, dt)
+        return np.linspace(self.P0, self.PN, len(times))
+
+    @classmethod
+    def _params(cls, group, t, dt):
+        m = len(rates.create_times(t, dt))
+        P0 = np.array([d.P0 for d in group], dtype='float64')[:, None]
+        PN = np.array([d.PN for d in group], dtype='float64')[:, None]
+
+        return dict(m=np.full(len(group), m), P0=P0, PN=PN, n=m)
+
+    @classmethod
+    def _block(cls, params, k):
+        # As np.linspace, to the last bit
+        n = params['n']
+        if n == 1:
+            return np.broadcast_to(params['P0'], k.shape)
+
+        step = (params['PN'] - params['P0']) / (n - 1)
+        P = k * step + params['P0']
+
+        return np.where(k == n - 1, params['PN'], P)
+
+
+class _Values(Drive):
+    """An already scaled number or 1D waveform, in a `Batch`."""
+    scale = 1.0
+
+    def __init__(self, P):
+        self.P = np.atleast_1d(np.asarray(P, dtype='float64'))
+        if self.P.ndim != 1:
+            raise ValueError("Each drive must be a number or 1D.")
+
+    def values(self, t, dt):
+        return self.P
+
+
+class Batch(object):
+    """The drives of a batch of runs, made a block of steps at a time.
+
+    Parameters
+    ----------
+    Ps : list
+        one drive per run; each a `Drive`, or an already scaled number
+        or 1D waveform.
+    t : float
+        run time (s).
+    dt : number
+        time resolution (s).
+
+    Notes
+    -----
+    Runs are grouped by the kind of their drive, and each group is
+    made in one vectorized step. Drifts are made forward, so blocks
+    should be asked for in order. Drives with neither (e.g. a
+    waveform) are made in full when the Batch is.
+    """
+
+    def __init__(self, Ps, t, dt):
+        Ps = [p if isinstance(p, Drive) else _Values(p) for p in Ps]
+        self.n_runs = len(Ps)
+
+        self.groups = []
+        for kind in sorted(set(type(p) for p in Ps), key=lambda c: c.__name__):
+            idx = np.array([i for i, p in enumerate(Ps) if type(p) is kind])
+            params = kind._params([Ps[i] for i in idx], t, dt)
+            self.groups.append((kind, idx, params))
+
+        # The longest drive
+        self.n = max(params['m'].max() for _, _, params in self.groups)
+
+    def __len__(self):
+        return self.n_runs
+
+    def block(self, i0, n):
+        """The (scaled) drive of each run at steps `i0` to `i0 + n`,
+        `(n_runs, n)`. Drives hold their last value past their end."""
+        steps = np.arange(i0, i0 + n)
+        P = np.empty((self.n_runs, n))
+        for kind, idx, params in self.groups:
+            k = np.minimum(steps, params['m'][:, None] - 1)
+            P[idx] = kind._block(params, k) * kind.scale
+
+        return P
+
+
+def evaluate(Ps, t, dt):
+    """The drive of each run in a batch.
+
+    Parameters
+    ----------
+    Ps : list
+        one drive per run; each a `Drive`, or an already scaled number
+        or 1D waveform.
+    t : float
+        run time (s).
+    dt : number
+        time resolution (s).
+
+    Returns
+    -------
+    Ps : 2D array
+        `(n_runs, n)`, where n is the longest drive. Shorter drives
+        hold their last value, so a batch of constants is `(n_runs, 1)`.
+    """
+    batch = Batch(Ps, t, dt)
+
+    return batch.block(0, batch.n)
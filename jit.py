@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Optional JIT compilation with numba.
+
+If numba is installed, `njit` and `prange` are numba's. Otherwise `njit`
+leaves functions as they are and `prange` is `range`, so kernels still
+import (and run, slowly). Models check `HAVE_NUMBA` to decide whether
+to use a kernel or their numpy code.
+"""
+from __future__ import division, print_function
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+
+
+def njit(*args, **kwargs):
+    """numba.njit, or a decorator that does nothing."""
+    if HAVE_NUMBA:
+        return numba.njit(*args, **kwargs)
+
+    # Used bare, as @njit
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+
+    return lambda f: f
+
+
+prange = numba.prange if HAVE_NUMBA else range
+
+
+def use_jit(jit):
+    """Decide whether to use a JIT kernel.
+
+    None means use one if numba is installed. True requires numba.
+    """
+    if jit is None:
+        return HAVE_NUMBA
+    if jit and not HAVE_NUMBA:
+        raise ImportError("jit requires numba, which is not installed.")
+
+    return bool(jit)
@@ -5,9 +5,18 @@
     [-o OMEGA]
     [-r OMEGA_RANGE]
     [-p PON]
+    [--ring R]
+    [--modules M]
+    [--p_out PO]
     [--seed SEED]
     [--dt DT]
     [--sigma SIGMA]
+    [--method METHOD]
+    [--no_drift_noise]
+    [--jit]
+    [--lfp_only]
+    [--stride STRIDE]
+    [--float32]
 
 Kuramoto model.
 
@@ -22,20 +31,48 @@ Kuramoto model.
         -o OMEGA                center frequency [default: 10]
         -r OMEGA_RANGE          min/max of the center [default: 1]
         -p PON                  probability a ith oscillator is on [default: 1]
+        --ring R                couple each oscillator only to its R neighbors
+                                on either side of a ring
+        --modules M             couple oscillators in M modules
+        --p_out PO              coupling between modules, relative to within
+                                [default: 0]
         --seed SEED             seed for creating the stimulus [default: 42]
         --dt DT                 time resolution [default: 1e-2]
         --sigma SIGMA  Population noise [default: 1e-2]
+        --method METHOD         SDE stepper, euler or heun [default: euler]
+        --no_drift_noise        only add noise in the SDE stepper, not again
+                                in the drift
+        --jit                   run the classic model with a compiled numba
+                                kernel
+        --lfp_only              only save the lfp, not the waves and thetas
+        --stride STRIDE         save every STRIDEth sample of the waves and
+                                thetas [default: 1]
+        --float32               save the waves and thetas as float32
 """
 from __future__ import division, print_function
 
+import math
+
 from docopt import docopt
 import numpy as np
-from sdeint import itoint
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
 from pykdf.kdf import save_kdf
 
+import rng
+from jit import njit, prange, use_jit
+
 
 # --
-def kuramoto(theta, t, omega, K, N, sigma):
+def kuramoto(theta,
+             t,
+             omega,
+             K,
+             N,
+             sigma,
+             A=None,
+             drift_noise=True,
+             prng=None):
     # In classic kuramoto...
 
     # each oscillator gets the same wieght K
@@ -43,54 +80,392 @@ def kuramoto(theta, t, omega, K, N, sigma):
     c = K / N
 
     # and all oscillators are connected to all
-    # oscillators
-    theta = np.atleast_2d(theta)  # for broadcasting
-    W = np.sum(np.sin(theta - theta.T), 1)
+    # oscillators. Then sum_j sin(theta_j - theta_i)
+    # only needs the order parameter, sum_j exp(i theta_j):
+    #   = cos(theta_i) sum_j sin(theta_j) - sin(theta_i) sum_j cos(theta_j)
+    # which is O(N), rather than O(N^2).
+    if A is None:
+        W = np.cos(theta) * np.sum(np.sin(theta)) - \
+            np.sin(theta) * np.sum(np.cos(theta))
+
+    # Otherwise weight each connection by the coupling
+    # matrix A. By the same identity this is two
+    # matrix-vector products, which for a sparse (or
+    # structured) A costs O(edges).
+    else:
+        W = np.cos(theta) * A.dot(np.sin(theta)) - \
+            np.sin(theta) * A.dot(np.cos(theta))
 
-    # ep = np.random.normal(0, sigma, N)
-    ep = np.random.normal(0, sigma, N)
+    # The SDE already adds noise with each step, so this
+    # extra noise in the drift can be turned off.
+    ep = 0
+    if drift_noise:
+        prng = np.random if prng is None else prng
+        ep = prng.normal(0, sigma, N)
 
     return omega + ep + (c * W)
 
 
-def onoff(theta, t, omega, K, N, sigma, p):
-    # Remove ith oscillator
-    # Or/and add jth back.
-    # When adding back, randomize the phase.
-    # HOWTO implement?
-    # Call different kuramotos, setting omega/theta
-    # as appropriates (resting as approproate too)
-    # Does just differentially noise have
-    # a similar effect?
+def ring(N, R):
+    """Couple each oscillator to its R nearest neighbors on each side
+    of a ring.
+
+    Returns a sparse (N, N) matrix. Weights are scaled so each row sums
+    to N, which keeps K comparable to all-to-all coupling.
+    """
+    if not 0 < R < N / 2:
+        raise ValueError("R must be > 0 and < N / 2.")
+
+    offsets = np.concatenate([np.arange(-R, 0), np.arange(1, R + 1)])
+    rows = np.repeat(np.arange(N), offsets.size)
+    cols = np.mod(rows + np.tile(offsets, N), N)
+    weights = np.ones(rows.size) * N / offsets.size
+
+    return csr_matrix((weights, (rows, cols)), shape=(N, N))
+
+
+def modules(N, M, p_out=0):
+    """Couple oscillators in M equal modules.
+
+    Oscillators are coupled with weight 1 inside their module, and
+    p_out between modules. Returns a (N, N) LinearOperator, whose
+    product only needs the sum over each module, so costs O(N).
+    Weights are scaled so each row sums to N.
+    """
+    if not 0 < M <= N:
+        raise ValueError("M must be > 0 and <= N.")
+
+    labels = np.arange(N) * M // N
+    size = np.bincount(labels)[labels]
+    scale = N / ((1 - p_out) * size + p_out * N)
+
+    def matvec(v):
+        v = np.ravel(v)
+        within = np.bincount(labels, weights=v)[labels]
+        return scale * ((1 - p_out) * within + p_out * np.sum(v))
+
+    return LinearOperator((N, N), matvec=matvec, rmatvec=matvec)
+
+
+def onoff(theta,
+          t,
+          omega,
+          K,
+          N,
+          sigma,
+          A=None,
+          drift_noise=True,
+          prng=None):
+    # As in kuramoto, but oscillators can be off, marked
+    # by a NaN theta (see integrate). These are left out
+    # of the coupling sums (i.e. the order parameter),
+    # which costs the same as the classic model.
+    c = K / N
+
+    on = ~np.isnan(theta)
+    s = np.where(on, np.sin(theta), 0)
+    co = np.where(on, np.cos(theta), 0)
+
+    if A is None:
+        W = np.cos(theta) * np.sum(s) - np.sin(theta) * np.sum(co)
+    else:
+        W = np.cos(theta) * A.dot(s) - np.sin(theta) * A.dot(co)
+
+    ep = 0
+    if drift_noise:
+        prng = np.random if prng is None else prng
+        ep = prng.normal(0, sigma, N)
+
     return omega + ep + (c * W)
 
 
-def simulate(theta0, T, omegas, K, N, sigma, p, dt):
-    """Simulate a Kuramoto model."""
+def integrate(f,
+              y0,
+              times,
+              sigma,
+              method='euler',
+              block=1000,
+              p=None,
+              prng=None,
+              onoff_prng=None,
+              drift_sigma=None,
+              drift_prng=None):
+    """Integrate dy = f(y, t) dt + sigma dW, with diagonal noise.
+
+    Parameters
+    ----------
+    f : function
+        the drift, f(y, t).
+    y0 : 1D array
+        initial state, (N,).
+    times : 1D array
+        evenly spaced times; y0 is at times[0].
+    sigma : number or 1D array
+        noise, shared or per variable.
+    method : {'euler', 'heun'}, optional (default = 'euler')
+        Euler-Maruyama, or stochastic Heun. With additive noise both
+        converge to the Ito solution.
+    block : int, optional (default = 1000)
+        number of steps to draw noise (and on/off masks) for at once.
+    p : {None, number}, optional (default = None)
+        if given, each variable is on at each step with probability p.
+        Off variables are NaN, and when a variable comes back on it
+        starts from a random phase in [-pi, pi).
+    prng : {None, Generator or RandomState}, optional (default = None)
+        source of the noise; None uses the global `np.random` state.
+    onoff_prng : {None, Generator or RandomState}, optional
+        source of the on/off masks and phases; None uses `prng`.
+    drift_sigma : {None, number}, optional (default = None)
+        if given, normal noise with this std dev is added to the drift.
+        It is drawn once a step, so both of Heun's drift evaluations
+        share it.
+    drift_prng : {None, Generator or RandomState}, optional
+        source of the drift noise; None uses `prng`.
+
+    Returns
+    -------
+    y : 2D array
+        the state at each of `times`, (len(times), N).
+    """
+    if method not in ('euler', 'heun'):
+        raise ValueError("method must be euler or heun.")
+
+    n_steps = len(times)
+    y0 = np.asarray(y0, dtype='float64')
+    h = times[1] - times[0] if n_steps > 1 else 0.0
+    scale = np.asarray(sigma) * np.sqrt(h)
+
+    prng = np.random if prng is None else prng
+    onoff_prng = prng if onoff_prng is None else onoff_prng
+    drift_prng = prng if drift_prng is None else drift_prng
+
+    y = np.zeros((n_steps, y0.size))
+    y[0] = y0
+    for i0 in range(1, n_steps, block):
+        n = min(block, n_steps - i0)
+        dW = prng.normal(0, 1, (n, y0.size)) * scale
+        ep = np.zeros((n, y0.size))
+        if drift_sigma is not None:
+            ep = drift_prng.normal(0, drift_sigma, (n, y0.size))
+        if p is not None:
+            ons = onoff_prng.uniform(0, 1, (n, y0.size)) < p
+            phases = onoff_prng.uniform(-np.pi, np.pi, (n, y0.size))
+
+        for j in range(n):
+            i = i0 + j
+            t = times[i - 1]
+
+            last = y[i - 1]
+            if p is not None:
+                # Rejoin with a random phase, or leave.
+                last = np.where(ons[j] & np.isnan(last), phases[j], last)
+                last = np.where(ons[j], last, np.nan)
+
+            drift = f(last, t) + ep[j]
+            y[i] = last + drift * h + dW[j]
+
+            if method == 'heun':
+                drift = (drift + f(y[i], t + h) + ep[j]) / 2
+                y[i] = last + drift * h + dW[j]
+
+    return y
+
+
+@njit(parallel=True, cache=True)
+def _block(y, i0, n, omegas, c, h, dW, ep, heun):
+    """Compiled all-to-all Kuramoto steps, in parallel over oscillators.
+
+    Fills in y[i0:i0 + n] from y[i0 - 1], given pre-drawn noise dW and
+    drift noise ep for the block.
+    """
+    N = y.shape[1]
+    drift = np.empty(N)
+    for j in range(n):
+        i = i0 + j
+
+        S = 0.0
+        C = 0.0
+        for m in prange(N):
+            S += math.sin(y[i - 1, m])
+            C += math.cos(y[i - 1, m])
+        for m in prange(N):
+            drift[m] = omegas[m] + ep[j, m] + c * (
+                math.cos(y[i - 1, m]) * S - math.sin(y[i - 1, m]) * C)
+            y[i, m] = y[i - 1, m] + drift[m] * h + dW[j, m]
+
+        if heun:
+            S = 0.0
+            C = 0.0
+            for m in prange(N):
+                S += math.sin(y[i, m])
+                C += math.cos(y[i, m])
+            for m in prange(N):
+                d = omegas[m] + ep[j, m] + c * (
+                    math.cos(y[i, m]) * S - math.sin(y[i, m]) * C)
+                y[i, m] = y[i - 1, m] + (drift[m] + d) / 2 * h + dW[j, m]
+
+
+def _integrate_jit(theta0,
+                   times,
+                   omegas,
+                   K,
+                   N,
+                   sigma,
+                   drift_noise,
+                   method,
+                   block=1000,
+                   prng=None,
+                   drift_prng=None):
+    """As `integrate` for the classic model, with a compiled kernel.
+
+    Noise is drawn as in `integrate`, so given the same sources both
+    give the same run. `prng` and `drift_prng` are the sources of the
+    SDE and drift noise; None uses `np.random`.
+    """
+    if method not in ('euler', 'heun'):
+        raise ValueError("method must be euler or heun.")
+
+    n_steps = len(times)
+    h = times[1] - times[0] if n_steps > 1 else 0.0
+    scale = sigma * np.sqrt(h)
+
+    prng = np.random if prng is None else prng
+    drift_prng = prng if drift_prng is None else drift_prng
+
+    y = np.zeros((n_steps, N))
+    y[0] = theta0
+    for i0 in range(1, n_steps, block):
+        n = min(block, n_steps - i0)
+        dW = prng.normal(0, 1, (n, N)) * scale
+        ep = np.zeros((n, N))
+        if drift_noise:
+            ep = drift_prng.normal(0, sigma, (n, N))
+
+        _block(y, i0, n, omegas, K / N, h, dW, ep, method == 'heun')
+
+    return y
+
+
+def simulate(theta0,
+             T,
+             omegas,
+             K,
+             N,
+             sigma,
+             p,
+             dt,
+             A=None,
+             drift_noise=True,
+             method='euler',
+             jit=False,
+             seed=None):
+    """Simulate a Kuramoto model.
+
+    By default all oscillators are coupled to all others. An (N, N)
+    coupling matrix A instead weights the coupling of the ith
+    oscillator to the jth by A[i, j] (and K / N). A can be an array,
+    a scipy.sparse matrix (see `ring`), or anything else with a
+    matrix-vector `dot` (see `modules`).
+
+    Noise is added to each oscillator by the SDE stepper (see
+    `integrate`) and, if `drift_noise` is True, again to the drift.
+
+    If p < 1 each oscillator is on at each step with probability p (see
+    `onoff`). Off oscillators have a NaN theta, and rejoin with a random
+    phase.
+
+    With jit=True the classic model (all-to-all, p = 1) runs in a
+    compiled numba kernel; None uses it when numba is installed and
+    the model is classic.
+
+    Given a `seed`, the SDE noise, the drift noise and the on/off
+    masks each come from their own `rng` stream of it. Otherwise all
+    come from the global `np.random` state.
+    """
 
     times = np.linspace(0, T, int(T / dt))
 
-    def G(_, t):
-        return np.diag(np.ones(N) * sigma)
-
+    prng, drift_prng, onoff_prng = None, None, None
+    if seed is not None:
+        prng = rng.stream(seed, 0, rng.NOISE)
+        drift_prng = rng.stream(seed, 0, rng.DRIFT)
+        onoff_prng = rng.stream(seed, 0, rng.ONOFF)
+
+    classic = A is None and np.allclose(p, 1)
+    if jit and not classic:
+        raise ValueError("jit only supports all-to-all coupling, with p = 1.")
+    if use_jit(jit) and classic:
+        thetas = _integrate_jit(
+            theta0,
+            times,
+            omegas,
+            K,
+            N,
+            sigma,
+            drift_noise,
+            method,
+            prng=prng,
+            drift_prng=drift_prng)
+        thetas = np.mod(thetas, 2 * np.pi)
+        thetas -= np.pi
+
+        return thetas, times
+
+    # The drift noise is drawn by integrate, once a step
     if np.allclose(p, 1):
+        p = None
 
         def f(theta, t):
-            return kuramoto(theta, t, omegas, K, N, sigma)
+            return kuramoto(theta, t, omegas, K, N, sigma, A, False)
     else:
 
         def f(theta, t):
-            return onoff(theta, t, omegas, K, N, sigma, p)
-
-    thetas = itoint(f, G, theta0, times)
+            return onoff(theta, t, omegas, K, N, sigma, A, False)
+
+    thetas = integrate(
+        f,
+        theta0,
+        times,
+        sigma,
+        method=method,
+        p=p,
+        prng=prng,
+        onoff_prng=onoff_prng,
+        drift_sigma=sigma if drift_noise else None,
+        drift_prng=drift_prng)
     thetas = np.mod(thetas, 2 * np.pi)
     thetas -= np.pi
 
     return thetas, times
 
 
-if __name__ == "__main__":
-    args = docopt(__doc__, version='alpha')
+def to_waves(thetas, omegas, times):
+    """From the unit circle to sin waves, (N, len(times)).
+
+    Oscillators that are off (NaN) give NaN.
+    """
+    return np.sin(omegas[:, None] * 2 * np.pi * times[None, :] + thetas.T)
+
+
+def to_lfp(thetas, omegas, times, block=1000):
+    """The simulated lfp, the mean of the sin waves.
+
+    The waves are summed over blocks of time steps, so the full (N, T)
+    waves are never built. Oscillators that are off (NaN) are silent.
+    """
+    N = thetas.shape[1]
+
+    lfp = np.zeros(len(times))
+    for i in range(0, len(times), block):
+        waves = np.sin(omegas[None, :] * 2 * np.pi *
+                       times[i:i + block, None] + thetas[i:i + block])
+        lfp[i:i + block] = np.nansum(waves, 1) / N
+
+    return lfp
+
+
+def main(argv=None, save=True):
+    args = docopt(__doc__, argv=argv, version='alpha')
 
     try:
         seed = int(args['--seed'])
@@ -104,6 +479,23 @@ if __name__ == "__main__":
     N = int(args['-n'])
     K = float(args['-k'])
     p = float(args['-p'])
+    if not 0 < p <= 1:
+        raise ValueError("PON must be > 0 and <= 1.")
+
+    # Coupling
+    A = None
+    coupling = {}
+    if args['--ring'] is not None and args['--modules'] is not None:
+        raise ValueError("Use only one of --ring or --modules.")
+    if args['--ring'] is not None:
+        R = int(args['--ring'])
+        A = ring(N, R)
+        coupling = dict(R=R)
+    if args['--modules'] is not None:
+        M = int(args['--modules'])
+        p_out = float(args['--p_out'])
+        A = modules(N, M, p_out)
+        coupling = dict(M=M, p_out=p_out)
 
     # Time
     T = float(args['-t'])
@@ -126,34 +518,55 @@ if __name__ == "__main__":
         raise ValueError("The center frequency must be > 0.")
 
     sigma = float(args['--sigma'])
+    method = args['--method']
+    drift_noise = not args['--no_drift_noise']
+    jit = args['--jit']
+
+    # What to save
+    lfp_only = args['--lfp_only']
+    stride = int(args['--stride'])
+    if stride < 1:
+        raise ValueError("stride must be >= 1.")
+    float32 = args['--float32']
 
     # Init
     omegas = np.random.uniform(a, b, size=N)
     theta0 = np.random.uniform(-np.pi * 2, np.pi * 2, size=N)
 
     # -
-    thetas, times = simulate(theta0, T, omegas, K, N, sigma, p, dt)
+    thetas, times = simulate(
+        theta0,
+        T,
+        omegas,
+        K,
+        N,
+        sigma,
+        p,
+        dt,
+        A,
+        drift_noise=drift_noise,
+        method=method,
+        jit=jit,
+        seed=seed)
 
     # -
-    # From the unit circle to sin waves, and the simulated lfp.
-    waves = []
-    for n in range(N):
-        th = thetas[:, n]
-        f = omegas[n]
-
-        wave = np.sin(f * 2 * np.pi * times + th)
-        waves.append(wave)
-
-    waves = np.vstack(waves)
-    lfp = waves.mean(0)
+    # From the unit circle to the simulated lfp, and
+    # (unless not wanted) the sin waves.
+    lfp = to_lfp(thetas, omegas, times)
+
+    traces = {}
+    if not lfp_only:
+        dtype = 'float32' if float32 else 'float64'
+        traces = dict(
+            thetas=thetas[::stride].astype(dtype),
+            waves=to_waves(thetas[::stride], omegas,
+                           times[::stride]).astype(dtype),
+            stride=stride)
 
     # -
-    save_kdf(
-        str(args['NAME']),
-        thetas=thetas,
+    results = dict(
         theta0=theta0,
         omegas=omegas,
-        waves=waves,
         lfp=lfp,
         seed=seed,
         sigma=sigma,
@@ -161,4 +574,16 @@ if __name__ == "__main__":
         K=K,
         times=times,
         t=T,
-        dt=dt)
+        dt=dt,
+        drift_noise=drift_noise)
+    results.update(coupling)
+    results.update(traces)
+
+    if save:
+        save_kdf(str(args['NAME']), **results)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,14 @@
     [--seed SEED]
     [--dt DT]
     [--sigma SIGMA]
+    [--backend BACKEND]
+    [--welch NPERSEG]
+    [--stride STRIDE]
+    [--decimate FACTOR]
+    [--record VARS]
+    [--burn T]
+    [--float32]
+    [--method METHOD]
 
 Wilcon-Cowan EI model.
 
@@ -26,6 +34,18 @@ Wilcon-Cowan EI model.
         --seed SEED random seed 
         --dt DT     time resolution [default: 1e-3]
         --sigma SIGMA  Population noise [default: 1e-2]
+        --backend BACKEND  simulation engine, numpy or brian2 [default: brian2]
+        --welch NPERSEG  stream the run, keeping the PSD of the lfp, and
+                         traces only with --stride or --decimate (numpy
+                         backend)
+        --stride STRIDE  keep every STRIDEth sample of the traces
+        --decimate FACTOR  keep every FACTORth sample, after an
+                           anti-aliasing filter
+        --record VARS    traces to keep, of E,I,lfp [default: E,I,lfp]
+        --burn T         drop the first T seconds [default: 0]
+        --float32        keep the traces as float32
+        --method METHOD  integration scheme, euler or heun (numpy backend)
+                         [default: euler]
 """
 from __future__ import division, print_function
 
@@ -33,70 +53,40 @@ from docopt import docopt
 import numpy as np
 from pykdf.kdf import save_kdf
 
-from brian2 import *
+import drives
+import wc
 
 
 # P=1, Q=3
-def _ie(t, P, Q, c1, c2, c3, c4, dt=1e-3, sigma=0.01):
-    # --
-    time = t * second
-    time_step = dt * second
-
-    # Fixed parameters.
-    re = 1.0
-    ri = 0.5
-
-    kn = 1.0
-    k = 1.0
-
-    tau_e = 5 * msecond
-    tau_i = 10 * msecond
-
-    P = P * (2** -0.03)
-
-    eqs = """
-    dE/dt = -E/tau_e + ((1 - re * E) * (1 / (1 + exp(-(k * c1 * E - k * c2 * I+ k* P - 2))) - 1/(1 + exp(2*1.0)))) / tau_e + (sigma / tau_e**.5 * xi_e) : 1
-    dI/dt = -I/tau_i + ((1 - ri * I) * (1 / (1 + exp(-2 * (kn * c3 * E - kn * c4 * I + kn * Q - 2.5))) - 1/(1 + exp(2*2.5)))) / tau_i + (sigma / tau_i**.5 * xi_i) : 1
-    # P : 1 (constant)
-    # Q : 1 (constant)
-    """
-
-    pops = NeuronGroup(1, model=eqs, namespace={'Q': Q, 'P': P})
-    pops.E = 0
-    pops.I = 0
-
-    # --
-    # Record
-    mon = StateMonitor(pops, ('E', 'I'), record=True)
-
-    # --
-    # Run
-    defaultclock.dt = time_step
-    run(time)
-
-    return mon.I, mon.E
-
-
-def ie(t, Ps, Qs, N, c1=15.0, c2=15.0, c3=15.0, c4=3.0, dt=1e-3, sigma=0.01):
+def ie(t,
+       Ps,
+       Qs,
+       N,
+       c1=15.0,
+       c2=15.0,
+       c3=15.0,
+       c4=3.0,
+       dt=1e-3,
+       sigma=0.01,
+       seed=None,
+       **options):
+    """Run the model; `options` and the results are as for
+    `wc.run_model`."""
     if len(Ps) != N:
         raise ValueError("Ps must have a len of {}".format(N))
     if len(Qs) != N:
         raise ValueError("Qs must have a len of {}".format(N))
 
-    E, I = [], []
-    for n, (p, q) in enumerate(zip(Ps, Qs)):
-        i, e = _ie(t, p, q, c1, c2, c3, c4, dt, sigma)
-        E.append(e)
-        I.append(i)
-
-    E = np.vstack(E).mean(0)
-    I = np.vstack(I).mean(0)
+    # The model's lfp is the mean of its N populations
+    Ps = [drives.Constant(p) for p in Ps]
 
-    return I, E
+    return wc.run_model(
+        t, Ps, np.asarray(Qs), c1, c2, c3, c4, dt=dt, sigma=sigma, seed=seed,
+        **options)
 
 
-if __name__ == "__main__":
-    args = docopt(__doc__, version='alpha')
+def main(argv=None, save=True):
+    args = docopt(__doc__, argv=argv, version='alpha')
 
     try:
         seed = int(args['--seed'])
@@ -128,18 +118,26 @@ if __name__ == "__main__":
     sigma = float(args['--sigma'])
 
     # -
-    I, E = ie(t, Ps, Qs, N, dt=dt, sigma=sigma)
-    lfp = (E + I)
-
-    # -
-    save_kdf(
-        str(args['NAME']),
+    results = dict(
         N=N,
-        E=E,
-        I=I,
-        lfp=lfp,
         t=t,
         dt=dt,
         sigma=sigma,
         Ps=Ps,
-        Qs=Qs)
+        Qs=Qs,
+        P=P,
+        Q=Q,
+        s=s)
+    results.update(ie(t, Ps, Qs, N, dt=dt, sigma=sigma, seed=seed,
+                      **wc.cli_options(args)))
+    if seed is not None:
+        results['seed'] = seed
+
+    if save:
+        save_kdf(str(args['NAME']), **results)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Reproducible, independent random streams.
+
+Each stream is named by a seed and a key. For example the E noise of
+the 3rd population in a run is `stream(seed, 3, E)`. Streams are
+numpy's SeedSequence spawn keys, so they are statistically independent,
+and a stream depends only on its seed and key. The same run gives the
+same result alone or in a batch, in any order, on any worker.
+"""
+from __future__ import division, print_function
+
+import numpy as np
+
+# Channels, the last part of a key
+E = 0  # WC noise in E
+I = 1  # WC noise in I
+NOISE = 2  # Kuramoto noise, added by the SDE stepper
+DRIFT = 3  # Kuramoto noise, added in the drift
+ONOFF = 4  # Kuramoto on/off masks and phases
+BRIAN = 5  # Brian2's own generator
+DRIVE = 6  # WC drives, e.g. drives.Drift
+
+
+def stream(seed, *key):
+    """A Generator for stream `key` of `seed`.
+
+    Parameters
+    ----------
+    seed : {None, int}
+        the run's seed. None uses fresh entropy, so is not
+        reproducible.
+    *key : int
+        the stream's key, e.g. (population, channel).
+
+    Returns
+    -------
+    prng : np.random.Generator
+    """
+    return np.random.Generator(np.random.PCG64(spawn(seed, *key)))
+
+
+def spawn(seed, *key):
+    """The SeedSequence of stream `key` of `seed`.
+
+    This is the same as `SeedSequence(seed).spawn(...)` followed down
+    the key, without spawning all the streams that come before it.
+    """
+    return np.random.SeedSequence(seed, spawn_key=tuple(int(k) for k in key))
+
+
+def int_seed(seed, *key):
+    """An int seed for stream `key` of `seed`, for generators (like
+    Brian2's) that can't take a SeedSequence."""
+    return int(spawn(seed, *key).generate_state(1)[0])
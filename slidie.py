@@ -10,6 +10,14 @@
     [--seed SEED]
     [--min_P MP]
     [--sigma SIGMA]
+    [--backend BACKEND]
+    [--welch NPERSEG]
+    [--stride STRIDE]
+    [--decimate FACTOR]
+    [--record VARS]
+    [--burn T]
+    [--float32]
+    [--method METHOD]
 
 Wilcon-Cowan EI model, where the oscillation frequency drifts
 with time.
@@ -27,6 +35,18 @@ with time.
         --seed SEED   random seed
         --min_P MP     smallest P possible [default: 1]
         --sigma SIGMA  Population noise [default: 1e-2]
+        --backend BACKEND  simulation engine, numpy or brian2 [default: brian2]
+        --welch NPERSEG  stream the run, keeping the PSD of the lfp, and
+                         traces only with --stride or --decimate (numpy
+                         backend)
+        --stride STRIDE  keep every STRIDEth sample of the traces
+        --decimate FACTOR  keep every FACTORth sample, after an
+                           anti-aliasing filter
+        --record VARS    traces to keep, of E,I,lfp [default: E,I,lfp]
+        --burn T         drop the first T seconds [default: 0]
+        --float32        keep the traces as float32
+        --method METHOD  integration scheme, euler or heun (numpy backend)
+                         [default: euler]
 """
 from __future__ import division, print_function
 
@@ -34,61 +54,34 @@ from docopt import docopt
 import numpy as np
 from pykdf.kdf import save_kdf
 
-from brian2 import *
-from fakespikes import rates
-
-
-def ie(t, P0, PN, c1=15.0, c2=15.0, c3=15.0, c4=3.0, Q=1, dt=1e-3, sigma=0.01):
-    # --
-    time = t * second
-    time_step = dt * second
-
-    # -
-    # Fixed parameters.
-    re = 1.0
-    ri = 0.5
-
-    kn = 1.0
-    k = 1.0
-
-    tau_e = 5 * msecond
-    tau_i = 10 * msecond
-
-    # -
-    # Define the drifting drive
-    times = rates.create_times(t, dt)
-    P = np.linspace(P0, PN, len(times))
-
-    # Scale it
-    P = P * (2**-0.03)
-
-    # Format for Brian2
-    P = TimedArray(P, dt=time_step)
-
+import drives
+import wc
+
+
+def ie(t,
+       P0,
+       PN,
+       c1=15.0,
+       c2=15.0,
+       c3=15.0,
+       c4=3.0,
+       Q=1,
+       dt=1e-3,
+       sigma=0.01,
+       seed=None,
+       **options):
+    """Run the model; `options` and the results are as for
+    `wc.run_model`."""
     # -
-    eqs = """
-            dE/dt = -E/tau_e + ((1 - re * E) * (1 / (1 + exp(-(k * c1 * E - k * c2 * I+ k * P(t) - 2))) - 1/(1 + exp(2*1.0)))) / tau_e  + (sigma / tau_e**.5 * xi_e) : 1
-            dI/dt = -I/tau_i + ((1 - ri * I) * (1 / (1 + exp(-2 * (kn * c3 * E - kn * c4 * I + kn * Q - 2.5))) - 1/(1 + exp(2*2.5)))) / tau_i + (sigma / tau_i**.5 * xi_i) : 1
-        """
+    # Define the sliding drive
+    drive = drives.Ramp(P0, PN)
 
-    pops = NeuronGroup(1, model=eqs, namespace={'Q': Q})
-    pops.E = 0
-    pops.I = 0
+    return wc.run_model(
+        t, drive, Q, c1, c2, c3, c4, dt=dt, sigma=sigma, seed=seed, **options)
 
-    # --
-    # Record
-    mon = StateMonitor(pops, ('E', 'I'), record=True)
 
-    # --
-    # Run
-    defaultclock.dt = time_step
-    run(time)
-
-    return mon.I.flatten(), mon.E.flatten(), P
-
-
-if __name__ == "__main__":
-    args = docopt(__doc__, version='alpha')
+def main(argv=None, save=True):
+    args = docopt(__doc__, argv=argv, version='alpha')
 
     try:
         seed = int(args['--seed'])
@@ -109,19 +102,23 @@ if __name__ == "__main__":
     sigma = float(args['--sigma'])
 
     # -
-    # Run model
-    I, E = ie(t, P0, PN, sigma=sigma)
-    lfp = (E + I)
-
-    # -
-    save_kdf(
-        str(args['NAME']),
-        E=E,
-        I=I,
-        lfp=lfp,
+    results = dict(
         t=t,
         dt=dt,
         P0=P0,
         PN=PN,
         Q=Q,
         sigma=sigma)
+    results.update(ie(t, P0, PN, dt=dt, sigma=sigma, seed=seed,
+                      **wc.cli_options(args)))
+    if seed is not None:
+        results['seed'] = seed
+
+    if save:
+        save_kdf(str(args['NAME']), **results)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Spectral estimates, and the bandwidth of spectral peaks.
+
+The analysis of a sweep is a Welch PSD of each run's lfp, and a
+Gaussian fit to each peak in a band of that PSD:
+
+    freqs, psds = welch(lfps, 1 / dt, nperseg=3000)
+    table = peaks(freqs, psds, fmin=15, fmax=40, mph=1e-3)
+
+where `lfps` is `(n_runs, n_samples)` (e.g. from `Store.load('lfp')`),
+and `table` has the center, power and width of every peak of every
+run. `bandwidth` does both.
+"""
+from __future__ import division, print_function
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import get_window
+from scipy.signal import welch as _welch
+
+from util import fit_gaussian_batch
+
+
+class OnlineWelch(object):
+    """Welch's averaged periodogram, over a stream of samples.
+
+    The PSD of all the samples given to `update` matches
+    `scipy.signal.welch(x, fs, window, nperseg, noverlap)` (with a
+    constant detrend, density scaling and a one sided spectrum), but
+    only the running sum of the periodograms and the last partial
+    segment are kept. Memory does not grow with the length of the
+    stream.
+
+    Parameters
+    ----------
+    fs : number
+        sampling rate (Hz).
+    nperseg : int, optional (default = 256)
+        samples per segment.
+    noverlap : {None, int}, optional (default = None)
+        samples shared by consecutive segments; None is nperseg // 2.
+    window : str or tuple, optional (default = 'hann')
+        the window, as for `scipy.signal.get_window`.
+
+    Notes
+    -----
+    The last axis of each block is time. Any leading axes (e.g. runs)
+    are kept, so an ensemble can be streamed in at once.
+    """
+
+    def __init__(self, fs, nperseg=256, noverlap=None, window='hann'):
+        if noverlap is None:
+            noverlap = nperseg // 2
+        if nperseg < 1:
+            raise ValueError("nperseg must be >= 1.")
+        if not 0 <= noverlap < nperseg:
+            raise ValueError("noverlap must be >= 0 and < nperseg.")
+
+        self.fs = fs
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.step = nperseg - noverlap
+        self.window = get_window(window, nperseg)
+
+        self.n_segments = 0
+        self._tail = None
+        self._sum = None
+
+    @property
+    def freqs(self):
+        """The frequency of each PSD bin (Hz)."""
+        return np.fft.rfftfreq(self.nperseg, 1 / self.fs)
+
+    def update(self, x):
+        """Add a block of samples, `(..., n)`."""
+        x = np.asarray(x, dtype='float64')
+        if self._tail is not None:
+            x = np.concatenate([self._tail, x], axis=-1)
+
+        n = x.shape[-1]
+        if n >= self.nperseg:
+            n_seg = (n - self.nperseg) // self.step + 1
+            segs = sliding_window_view(x, self.nperseg, axis=-1)
+            segs = segs[..., :(n_seg - 1) * self.step + 1:self.step, :]
+            segs = segs - segs.mean(axis=-1, keepdims=True)
+
+            pxx = np.abs(np.fft.rfft(segs * self.window, axis=-1))**2
+            pxx = pxx.sum(axis=-2)
+            self._sum = pxx if self._sum is None else self._sum + pxx
+            self.n_segments += n_seg
+
+            x = x[..., n_seg * self.step:]
+
+        # Copy, so the block it came from can be freed
+        self._tail = x.copy()
+
+        return self
+
+    def psd(self):
+        """The PSD so far, `(..., n_freqs)`."""
+        if self.n_segments == 0:
+            raise ValueError("fewer than nperseg samples have been seen.")
+
+        psd = self._sum / self.n_segments
+        psd /= self.fs * np.sum(self.window**2)
+
+        # One sided, so double all but DC (and Nyquist)
+        if self.nperseg % 2:
+            psd[..., 1:] *= 2
+        else:
+            psd[..., 1:-1] *= 2
+
+        return psd
+
+
+def welch(X, fs, nperseg=3000, noverlap=None):
+    """Welch PSDs of many signals, in one batched FFT.
+
+    Parameters
+    ----------
+    X : 1D or 2D array_like
+        signals, one per row `(n_runs, n_samples)`.
+    fs : number
+        sampling rate (Hz).
+    nperseg : int, optional (default = 3000)
+        samples per segment, at most `n_samples`.
+    noverlap : {None, int}, optional (default = None)
+        samples shared by segments; None is nperseg // 2.
+
+    Returns
+    -------
+    freqs : 1D array
+        frequency of each bin (Hz).
+    psds : 2D array
+        the PSDs, `(n_runs, n_freqs)`.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype='float64'))
+    nperseg = min(nperseg, X.shape[-1])
+
+    return _welch(
+        X, fs, nperseg=nperseg, noverlap=noverlap, scaling='density',
+        axis=-1)
+
+
+def peaks(freqs, psds, fmin=15, fmax=40, stdev0=20, n_jobs=None,
+          **detect_pars):
+    """Fit a Gaussian to each peak of many PSDs, in a band.
+
+    Parameters
+    ----------
+    freqs : 1D array
+        frequency of each bin (Hz).
+    psds : 1D or 2D array_like
+        the PSDs, one per row.
+    fmin, fmax : number, optional (default = 15, 40)
+        the band (Hz), exclusive.
+    stdev0 : number, optional (default = 20)
+        initial width of each Gaussian.
+    n_jobs : {None, int}, optional (default = None)
+        see `util.fit_gaussian_batch`.
+    **detect_pars
+        passed to `util.detect_peaks` (e.g. `mph`).
+
+    Returns
+    -------
+    table : dict
+        `center`, `power` and `width` of each peak, each `(n_runs,
+        max_peaks)` and padded with NaN. The Gaussians are
+        `power * exp(-((f - center) / width)**2)`, so `width` is
+        sqrt(2) times their std dev, and the FWHM is
+        2 * sqrt(ln 2) = 1.665 times `width`.
+    """
+    psds = np.atleast_2d(psds)
+    m = np.logical_and(freqs > fmin, freqs < fmax)
+
+    centers, powers, stdevs, _ = fit_gaussian_batch(
+        freqs[m], psds[:, m], stdev0, n_jobs=n_jobs, **detect_pars)
+
+    return dict(center=centers, power=powers, width=stdevs)
+
+
+def bandwidth(X, fs, nperseg=3000, noverlap=None, **peak_pars):
+    """The `peaks` of the Welch PSD of each of `X`'s rows.
+
+    Returns
+    -------
+    freqs : 1D array
+    psds : 2D array
+        see `welch`.
+    table : dict
+        see `peaks`.
+    """
+    freqs, psds = welch(X, fs, nperseg, noverlap)
+
+    return freqs, psds, peaks(freqs, psds, **peak_pars)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""A single HDF5 store for all the runs of a sweep.
+
+Instead of one file per run, every run is appended to one file. Scalar
+results (`P`, `Q`, `N`, `s`, `d`, `K`, `seed`, ...) go into an index,
+and array results (`lfp`, `E`, `I`, ...) are stacked along a first,
+run, axis. Arrays that differ in shape between runs are padded with
+NaN, as are values a run did not have.
+
+    with Store('data/mixie_n.hdf5') as store:
+        lfps = store.load('lfp', N=10, s=0.5)
+"""
+from __future__ import division, print_function
+
+import h5py
+import numpy as np
+
+
+class Store(object):
+    """An appendable HDF5 store of sweep results.
+
+    Parameters
+    ----------
+    path : str
+        name of the HDF5 file.
+    mode : str, optional (default = 'a')
+        'r' to read, 'a' to read and append, 'w' to overwrite.
+
+    Notes
+    -----
+    HDF5 does not support concurrent writers. When runs are computed in
+    parallel, the workers should return their results to one process
+    which appends them (as `sweep.py --store` does).
+    """
+
+    def __init__(self, path, mode='a'):
+        self.h5 = h5py.File(path, mode)
+        if mode != 'r':
+            self.h5.require_group('index')
+            self.h5.require_group('data')
+            if 'name' not in self.h5['index']:
+                self.h5['index'].create_dataset(
+                    'name', (0, ),
+                    maxshape=(None, ),
+                    dtype=h5py.string_dtype(),
+                    chunks=(1024, ))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.h5['index/name'].shape[0]
+
+    def close(self):
+        self.h5.close()
+
+    @property
+    def names(self):
+        """The name of each run."""
+        return np.array([n.decode() for n in self.h5['index/name'][:]])
+
+    @property
+    def index(self):
+        """The scalar parameters of each run, as a dict of 1D arrays."""
+        return {k: v[:] for k, v in self.h5['index'].items() if k != 'name'}
+
+    def keys(self):
+        """The names of the stacked arrays."""
+        return list(self.h5['data'].keys())
+
+    def append(self, name, **results):
+        """Append one run.
+
+        Parameters
+        ----------
+        name : str
+            name of the run.
+        **results
+            the run's results. Numeric scalars are added to the index,
+            numeric arrays are stacked, and anything else (e.g. None or
+            strings) is skipped.
+        """
+        n = len(self)
+
+        values = {}
+        for k, v in results.items():
+            if v is None:
+                continue
+            v = np.asarray(v)
+            if not (np.issubdtype(v.dtype, np.number) or v.dtype == bool):
+                continue
+
+            group = 'index' if v.ndim == 0 else 'data'
+            if k == 'name' and group == 'index':
+                raise ValueError("'name' is reserved for the run name")
+
+            # Arrays kept as float32 (e.g. --float32 traces) stay so
+            dtype = 'float32' if group == 'data' and \
+                v.dtype == np.float32 else 'float64'
+            values[group + '/' + k] = v.astype(dtype)
+
+            if k not in self.h5[group]:
+                chunks = (1024, ) if v.ndim == 0 else \
+                    (1, ) + tuple(max(s, 1) for s in v.shape)
+                self.h5[group].create_dataset(
+                    k, (n, ) + v.shape,
+                    maxshape=(None, ) * (v.ndim + 1),
+                    dtype=dtype,
+                    fillvalue=np.nan,
+                    chunks=chunks)
+
+        # Grow every dataset by one run, and then fill it in.
+        for group in ('index', 'data'):
+            for k, ds in self.h5[group].items():
+                v = values.get(group + '/' + k)
+                shape = ds.shape[1:]
+                if v is not None:
+                    if v.ndim != len(shape):
+                        raise ValueError("{} must have {} dims".format(
+                            k, len(shape)))
+                    shape = np.maximum(shape, v.shape)
+                ds.resize((n + 1, ) + tuple(shape))
+
+                if v is not None:
+                    ds[(n, ) + tuple(slice(0, s) for s in v.shape)] = v
+
+        self.h5['index/name'][n] = name
+        self.h5.flush()
+
+    def select(self, **params):
+        """Find runs matching `params`.
+
+        Parameters
+        ----------
+        **params
+            index values to match. A value can be a number, or a list
+            of numbers any of which can match.
+
+        Returns
+        -------
+        idx : 1D array
+            the matching run numbers.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for k, v in params.items():
+            x = self.h5['index'][k][:]
+            mask &= np.any(
+                [np.isclose(x, vi) for vi in np.atleast_1d(v)], axis=0)
+
+        return np.flatnonzero(mask)
+
+    def load(self, key, **params):
+        """Load `key` for the runs matching `params` (see `select`).
+
+        Returns
+        -------
+        x : array
+            values of `key`, stacked along the first axis.
+        """
+        if key in self.h5['data']:
+            ds = self.h5['data'][key]
+        else:
+            ds = self.h5['index'][key]
+
+        if not params:
+            return ds[:]
+
+        idx = self.select(**params)
+        if idx.size == 0:
+            return np.zeros((0, ) + ds.shape[1:])
+
+        return ds[idx]
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Usage: sweep.py MODEL COMMAND ARGS...
+    [-j J]
+    [--joblog LOG]
+    [--resume]
+    [--store STORE]
+    [--cache DIR]
+    [--cache_size GB]
+    [--bandwidth]
+    [--fmin FMIN]
+    [--fmax FMAX]
+    [--mph MPH]
+    [--nperseg NPERSEG]
+    [--nice NICE]
+
+Run a parameter sweep of a model in a persistent pool of workers.
+
+Each worker imports MODEL once, then runs its `main()` for every
+command it is given. COMMAND is a template for the model's command
+line, written as for GNU parallel: `{1}`, `{2}`, ... are replaced by
+values from the 1st, 2nd, ... `:::` separated list in ARGS, and `{}`
+by all values. Every combination of values is run.
+
+    Arguments
+        MODEL       the model to run (ie, mixie, burstie, driftie,
+                    slidie or kur)
+        COMMAND     template of the model's arguments
+        ARGS        values, as `::: a b c ::: 1 2 3 ...`
+
+    Options:
+        -h --help       show this screen
+        -j J            number of workers [default: 10]
+        --joblog LOG    log of each finished run
+        --resume        skip runs that already succeeded in LOG
+        --store STORE   append all results to one HDF5 store
+                        (see store.py), instead of a file per run
+        --cache DIR     reuse the results of seeded runs cached in DIR
+                        (see cache.py), and cache the new ones
+        --cache_size GB  largest size of the cache, in GB [default: 10]
+        --bandwidth     keep only the PSD of each run's lfp, and the
+                        center, power and width of its peaks (see
+                        spectral.py), rather than its traces
+        --fmin FMIN     lowest frequency of peaks [default: 15]
+        --fmax FMAX     highest frequency of peaks [default: 40]
+        --mph MPH       smallest peak height [default: 1e-3]
+        --nperseg NPERSEG  samples per Welch segment [default: 3000]
+        --nice NICE     niceness of the workers [default: 0]
+
+    Example:
+        python sweep.py mixie 'data/mixie_n/n{1}_run{2} -n {1} --seed {2}' \\
+            ::: 3 5 7 ::: {1..100}
+"""
+from __future__ import division, print_function
+
+import os
+import sys
+import time
+import shlex
+import importlib
+import itertools
+import traceback
+from multiprocessing import Pool
+
+from docopt import docopt
+
+from pykdf.kdf import save_kdf
+
+from cache import Cache, cacheable
+from spectral import welch, peaks
+from store import Store
+
+MODELS = ('ie', 'mixie', 'burstie', 'driftie', 'slidie', 'kur')
+
+# Results dropped by --bandwidth
+TRACES = ('E', 'I', 'lfp', 'thetas', 'waves', 'times')
+
+# The model, imported once per worker
+_model = None
+_keep = False
+_cache = None
+_bands = None
+
+
+def grid(args):
+    """Split `::: a b ::: 1 2` style ARGS into the product of values."""
+    if not args or args[0] != ':::':
+        raise ValueError("ARGS must start with :::")
+
+    values = []
+    for arg in args:
+        if arg == ':::':
+            values.append([])
+        else:
+            values[-1].append(arg)
+    if not all(values):
+        raise ValueError("Each ::: must be followed by some values")
+
+    return list(itertools.product(*values))
+
+
+def commands(template, args):
+    """Fill in `template` for every combination in `args`."""
+    cmds = []
+    for values in grid(args):
+        cmd = template.replace('{}', ' '.join(values))
+        for i, v in enumerate(values):
+            cmd = cmd.replace('{{{}}}'.format(i + 1), v)
+        cmds.append(cmd)
+
+    return cmds
+
+
+def read_joblog(joblog):
+    """Return the commands that succeeded in `joblog`."""
+    done = set()
+    if joblog is None or not os.path.exists(joblog):
+        return done
+
+    with open(joblog) as fi:
+        next(fi, None)  # header
+        for line in fi:
+            row = line.rstrip('\n').split('\t')
+            if len(row) == 5 and row[3] == '0':
+                done.add(row[4])
+
+    return done
+
+
+def _reduce(results, nperseg=3000, **peak_pars):
+    """Reduce a run's `results` to the `peaks` of its lfp's PSD."""
+    if 'psd' in results:
+        freqs, psd = results['freqs'], results['psd']
+    else:
+        # The lfp is sampled every step, unless its rate is saved (as
+        # for WC traces kept at a stride). kur's `stride` thins only its
+        # thetas and waves, so is not used.
+        fs = results.get('fs', 1 / results['dt'])
+        freqs, psd = welch(results['lfp'], fs, nperseg)
+
+    table = peaks(freqs, psd, n_jobs=1, **peak_pars)
+
+    reduced = {k: v for k, v in results.items() if k not in TRACES}
+    reduced.update(freqs=freqs, psd=psd[0] if psd.ndim > 1 else psd)
+    reduced.update({k: v[0] for k, v in table.items()})
+
+    return reduced
+
+
+def _init(model, nice, keep, cache=None, cache_size=None, bands=None):
+    global _model, _keep, _cache, _bands
+    if nice:
+        os.nice(nice)
+    _model = importlib.import_module(model)
+    _keep = keep
+    if cache is not None:
+        _cache = Cache(cache, cache_size)
+    _bands = bands
+
+
+def _run(job):
+    seq, cmd = job
+    argv = shlex.split(cmd)
+
+    # When keeping results, they are sent back (and so stored) by
+    # the parent, rather than saved by each run.
+    name, results = None, None
+    cached = False
+
+    start = time.time()
+    try:
+        args = docopt(_model.__doc__, argv=argv)
+        name = args['NAME']
+
+        key = None
+        if _cache is not None and cacheable(args):
+            key = _cache.key(_model, args)
+            results = _cache.get(key)
+            cached = results is not None
+
+        # A run saves its own file, unless its results are sent
+        # back (for the store), were cached, or are to be reduced.
+        save = not (_keep or _bands is not None)
+        if not cached:
+            results = _model.main(argv, save=save)
+            if key is not None:
+                _cache.put(key, results)
+
+        if _bands is not None:
+            results = _reduce(results, **_bands)
+        if not _keep and (cached or not save):
+            save_kdf(str(name), **results)
+
+        if not _keep:
+            name, results = None, None
+        exitval = 0
+    except (Exception, SystemExit):
+        traceback.print_exc()
+        exitval = 1
+
+    return (seq, start, time.time() - start, exitval, cmd, name, results,
+            cached)
+
+
+def sweep(model,
+          cmds,
+          n_jobs=10,
+          joblog=None,
+          resume=False,
+          store=None,
+          cache=None,
+          cache_size=None,
+          bands=None,
+          nice=0):
+    """Run `model` for each of `cmds` in a pool of `n_jobs` workers.
+
+    Parameters
+    ----------
+    model : str
+        name of the model module.
+    cmds : list of str
+        the model's command line, one per run.
+    n_jobs : int, optional (default = 10)
+        number of worker processes.
+    joblog : {None, str}, optional (default = None)
+        a tab separated log of each finished run.
+    resume : bool, optional (default = False)
+        if True, skip commands that already succeeded in `joblog`.
+    store : {None, str}, optional (default = None)
+        if given, append every run to this HDF5 `Store`, rather than
+        have each run save its own file.
+    cache : {None, str}, optional (default = None)
+        if given, a `Cache` directory. Seeded runs found in it are not
+        run again, and new seeded runs are added to it.
+    cache_size : {None, number}, optional (default = None)
+        the largest size of the cache (bytes); None is unbounded.
+    bands : {None, dict}, optional (default = None)
+        if given, each run is reduced to its lfp's PSD and the center,
+        power and width of its peaks, with these `nperseg` and
+        `spectral.peaks` parameters (e.g. `fmin`, `fmax` and `mph`).
+        Cached runs keep all their results, so can be reduced again.
+    nice : int, optional (default = 0)
+        niceness of the workers.
+
+    Returns
+    -------
+    n_failed : int
+        the number of runs that failed.
+    """
+    if model not in MODELS:
+        raise ValueError("model must be one of {}".format(MODELS))
+
+    done = read_joblog(joblog) if resume else set()
+    jobs = [(seq + 1, cmd) for seq, cmd in enumerate(cmds)
+            if cmd not in done]
+
+    n_total = len(jobs)
+    n_failed = 0
+    n_cached = 0
+    if n_total == 0:
+        return n_failed
+
+    log = None
+    if joblog is not None:
+        new = not (resume and os.path.exists(joblog))
+        log = open(joblog, 'a' if resume else 'w')
+        if new:
+            log.write("Seq\tStarttime\tJobRuntime\tExitval\tCommand\n")
+
+    if store is not None:
+        store = Store(store, 'a' if resume else 'w')
+
+    pool = Pool(
+        n_jobs,
+        initializer=_init,
+        initargs=(model, nice, store is not None, cache, cache_size,
+                  bands))
+    try:
+        runs = pool.imap_unordered(_run, jobs)
+        for n, run in enumerate(runs):
+            seq, start, runtime, exitval, cmd, name, results, cached = run
+            n_failed += exitval != 0
+            n_cached += cached
+            if store is not None and exitval == 0:
+                store.append(name, **results)
+            if log is not None:
+                log.write("{}\t{:.3f}\t{:.3f}\t{}\t{}\n".format(
+                    seq, start, runtime, exitval, cmd))
+                log.flush()
+
+            sys.stderr.write("[{}/{}, {} failed, {} cached] {}\n".format(
+                n + 1, n_total, n_failed, n_cached, cmd))
+    finally:
+        pool.close()
+        pool.join()
+        if log is not None:
+            log.close()
+        if store is not None:
+            store.close()
+
+    return n_failed
+
+
+def main(argv=None):
+    args = docopt(__doc__, argv=argv, version='alpha')
+
+    cmds = commands(args['COMMAND'], args['ARGS'])
+
+    bands = None
+    if args['--bandwidth']:
+        bands = dict(
+            fmin=float(args['--fmin']),
+            fmax=float(args['--fmax']),
+            mph=float(args['--mph']),
+            nperseg=int(args['--nperseg']))
+
+    n_failed = sweep(
+        args['MODEL'],
+        cmds,
+        n_jobs=int(args['-j']),
+        joblog=args['--joblog'],
+        resume=args['--resume'],
+        store=args['--store'],
+        cache=args['--cache'],
+        cache_size=float(args['--cache_size']) * 1e9,
+        bands=bands,
+        nice=int(args['--nice']))
+
+    if n_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""The models are flat modules, imported from the repository root."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
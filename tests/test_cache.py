@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Cache keys, and the code versions in them."""
+from __future__ import division, print_function
+
+import importlib.util
+
+import cache
+
+MODEL = """
+def main():
+    # Only imported when it is needed, as wc.run_model does wcnet
+    import dep
+    return dep.f()
+"""
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location('model', str(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def test_lazy_dependency(tmp_path):
+    (tmp_path / 'model.py').write_text(MODEL)
+    (tmp_path / 'dep.py').write_text("def f():\n    return 1\n")
+    model = _load(tmp_path / 'model.py')
+
+    version = cache.code_version(model)
+    assert cache.code_version(model) == version
+
+    (tmp_path / 'dep.py').write_text("def f():\n    return 2\n")
+    assert cache.code_version(model) != version
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Drives made a block at a time, against drives made in full."""
+from __future__ import division, print_function
+
+import numpy as np
+
+import drives
+
+
+def test_drift_blocks():
+    # Blocks overlap by a step, as in wc._integrate
+    Ps = [drives.Drift(2, 0.1, 1.8, seed=3), drives.Constant(1),
+          drives.Drift(2, 0.1, seed=4, pop=1)]
+    full = np.array([Ps[0].values(2, 1e-3), Ps[2].values(2, 1e-3)])
+
+    batch = drives.Batch(Ps, 2, 1e-3)
+    blocks = np.hstack(
+        [batch.block(i0, 101)[:, :100] for i0 in range(0, 2000, 100)])
+
+    assert np.allclose(
+        blocks[[0, 2]], full * drives.SCALE, rtol=0, atol=1e-12)
+    assert full[0].min() == 1.8
+    assert np.allclose(
+        batch.block(0, 10), drives.evaluate(Ps, 2, 1e-3)[:, :10])
+
+
+def test_drift_seed():
+    np.random.seed(1)
+    P1 = drives.Drift(2, 0.1, seed=5).values(1, 1e-3)
+    np.random.seed(2)
+    P2 = drives.Drift(2, 0.1, seed=5).values(1, 1e-3)
+    P3 = drives.Drift(2, 0.1, seed=6).values(1, 1e-3)
+
+    assert np.array_equal(P1, P2)
+    assert not np.array_equal(P1, P3)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""The Kuramoto model: its coupling, stepper and on/off mode."""
+from __future__ import division, print_function
+
+import numpy as np
+
+import kur
+
+
+def _dense(theta, omega, K, N):
+    """The classic O(N^2) drift, sum_j sin(theta_j - theta_i)."""
+    return omega + K / N * np.sum(np.sin(theta - theta[:, None]), 1)
+
+
+def test_all_to_all():
+    prng = np.random.RandomState(1)
+    N = 50
+    theta = prng.uniform(-np.pi, np.pi, N)
+    omega = prng.normal(20, 1, N)
+
+    dense = _dense(theta, omega, 4, N)
+    fast = kur.kuramoto(theta, 0, omega, 4, N, 0.1, drift_noise=False)
+    ones = kur.kuramoto(
+        theta, 0, omega, 4, N, 0.1, A=np.ones((N, N)), drift_noise=False)
+
+    assert np.allclose(fast, dense, rtol=0, atol=1e-10)
+    assert np.allclose(ones, dense, rtol=0, atol=1e-10)
+
+
+def test_heun_drift_noise():
+    # Both of Heun's drift evaluations share one draw of drift noise,
+    # as in the compiled kernel (here run as plain Python if need be)
+    N = 20
+    prng = np.random.RandomState(2)
+    theta0 = prng.uniform(-np.pi, np.pi, N)
+    omegas = prng.normal(20, 1, N)
+    times = np.linspace(0, 0.5, 51)
+
+    def f(theta, t):
+        return kur.kuramoto(theta, t, omegas, 4, N, 0.1, drift_noise=False)
+
+    y = kur.integrate(
+        f, theta0, times, 0.1, method='heun', block=20,
+        prng=np.random.RandomState(3), drift_sigma=0.1,
+        drift_prng=np.random.RandomState(4))
+    y_jit = kur._integrate_jit(
+        theta0, times, omegas, 4, N, 0.1, True, 'heun', block=20,
+        prng=np.random.RandomState(3), drift_prng=np.random.RandomState(4))
+
+    assert np.allclose(y, y_jit, rtol=0, atol=1e-10)
+
+
+def test_onoff_coupling():
+    # Off (NaN) oscillators are left out of the coupling sums
+    prng = np.random.RandomState(5)
+    N = 30
+    theta = prng.uniform(-np.pi, np.pi, N)
+    omega = prng.normal(20, 1, N)
+    on = prng.uniform(0, 1, N) < 0.6
+    theta[~on] = np.nan
+
+    drift = kur.onoff(theta, 0, omega, 4, N, 0.1, drift_noise=False)
+    classic = kur.kuramoto(
+        theta[on], 0, omega[on], 4, N, 0.1, drift_noise=False)
+
+    assert np.all(np.isnan(drift[~on]))
+    assert np.allclose(drift[on], classic, rtol=0, atol=1e-10)
+
+
+def test_onoff_p1():
+    # With p = 1 no oscillator is ever off
+    N = 20
+    prng = np.random.RandomState(6)
+    theta0 = prng.uniform(-np.pi, np.pi, N)
+    omegas = prng.normal(20, 1, N)
+    times = np.linspace(0, 0.5, 51)
+
+    def f(theta, t):
+        return kur.onoff(theta, t, omegas, 4, N, 0.1, drift_noise=False)
+
+    def f_classic(theta, t):
+        return kur.kuramoto(theta, t, omegas, 4, N, 0.1, drift_noise=False)
+
+    y = kur.integrate(
+        f, theta0, times, 0.1, p=1, prng=np.random.RandomState(7),
+        onoff_prng=np.random.RandomState(8))
+    y_classic = kur.integrate(
+        f_classic, theta0, times, 0.1, prng=np.random.RandomState(7))
+
+    assert np.allclose(y, y_classic, rtol=0, atol=1e-10)
+
+
+def test_onoff_rejoin():
+    # Without dynamics, an oscillator holds its phase while on, and
+    # rejoins from a fresh one
+    N = 10
+    times = np.linspace(0, 1, 201)
+    y = kur.integrate(lambda theta, t: np.zeros(N), np.zeros(N), times, 0,
+                      p=0.7, prng=np.random.RandomState(9))
+    off = np.isnan(y[1:])
+
+    assert 0.2 < off.mean() < 0.4
+    for m in range(N):
+        on = ~off[:, m]
+        runs = np.split(y[1:, m], np.flatnonzero(np.diff(on)) + 1)
+        held = [r[0] for r in runs if np.all(np.isfinite(r))]
+        assert all(np.all(r == r[0]) for r in runs if np.isfinite(r[0]))
+        assert len(set(held)) == len(held)
+        assert all(-np.pi <= h < np.pi for h in held)
+
+
+def test_onoff_lfp():
+    # Off oscillators are silent in the lfp
+    N = 50
+    prng = np.random.RandomState(10)
+    theta0 = prng.uniform(-np.pi, np.pi, N)
+    omegas = prng.uniform(9, 11, N)
+
+    thetas, times = kur.simulate(
+        theta0, 1, omegas, 6, N, 0.01, 0.5, 1e-2, seed=11)
+    lfp = kur.to_lfp(thetas, omegas, times)
+    waves = kur.to_waves(thetas, omegas, times)
+
+    assert np.isnan(thetas[1:]).any()
+    assert np.all(np.isfinite(lfp))
+    assert np.allclose(lfp, np.nansum(waves, 0) / N)
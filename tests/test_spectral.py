@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""The streamed Welch PSD against scipy's."""
+from __future__ import division, print_function
+
+import numpy as np
+import pytest
+from scipy.signal import welch
+
+from spectral import OnlineWelch
+
+
+@pytest.mark.parametrize('chunk', [1, 37, 1000])
+@pytest.mark.parametrize('nperseg,noverlap', [
+    (256, None), (256, 0), (256, 200), (255, 100), (100, 99)])
+def test_online_welch(chunk, nperseg, noverlap):
+    # Two runs, so leading axes are kept too. The length is not a
+    # whole number of segments, so the last partial one is dropped.
+    x = np.random.RandomState(0).normal(0, 1, (2, 3001))
+
+    spec = OnlineWelch(500, nperseg, noverlap)
+    for i in range(0, x.shape[-1], chunk):
+        spec.update(x[:, i:i + chunk])
+    freqs, psd = welch(x, 500, nperseg=nperseg, noverlap=noverlap)
+
+    assert np.allclose(spec.freqs, freqs)
+    assert np.allclose(spec.psd(), psd, rtol=1e-10, atol=0)
+
+
+def test_online_welch_short():
+    spec = OnlineWelch(500, 256).update(np.zeros(100))
+    with pytest.raises(ValueError):
+        spec.psd()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""The reduction of a run to the peaks of its lfp's PSD."""
+from __future__ import division, print_function
+
+import numpy as np
+
+import sweep
+
+
+def _lfp(fs, t=10, f=25):
+    prng = np.random.RandomState(0)
+    times = np.arange(0, t, 1 / fs)
+
+    return np.sin(2 * np.pi * f * times) + prng.normal(0, 0.1, times.size)
+
+
+def test_reduce_rate():
+    # kur's stride thins its thetas, but not its lfp
+    kur = dict(dt=1e-3, stride=4, lfp=_lfp(1000))
+    # WC traces kept at a stride are saved with their rate
+    wc = dict(dt=1e-3, stride=4, fs=250, lfp=_lfp(250))
+
+    for results in (kur, wc):
+        reduced = sweep._reduce(results, nperseg=1000, mph=0.01)
+        largest = np.nanargmax(reduced['power'])
+
+        assert abs(reduced['center'][largest] - 25) < 1
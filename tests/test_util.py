@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Gaussian fits to spectral peaks, warm started or not."""
+from __future__ import division, print_function
+
+import numpy as np
+
+import util
+
+x = np.linspace(1, 60, 240)
+
+
+def _spectrum(w):
+    """Three Gaussian peaks, all of width w."""
+    return sum(a * np.exp(-((x - c) / w)**2)
+               for a, c in ((1, 15), (0.8, 30), (0.6, 45)))
+
+
+def test_sweep_repeated():
+    # A repeated spectrum warm starts at its optimum, which is kept
+    Y = np.array([_spectrum(w) for w in (3, 3, 3.05, 3.1)])
+
+    _, _, stdevs, _ = util.fit_gaussian_sweep(x, Y, 20)
+    _, _, cold, _ = util.fit_gaussian_batch(x, Y, 20, n_jobs=1)
+
+    assert np.all(np.isfinite(stdevs))
+    assert np.allclose(stdevs, cold, rtol=1e-6)
+    assert np.allclose(stdevs[[0, 2, 3]].mean(1), [3, 3.05, 3.1], rtol=1e-2)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""The numpy WC engine (`wc.py`) against Brian2 (`wcnet.py`)."""
+from __future__ import division, print_function
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+import drives
+import wc
+import wcnet
+from spectral import welch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The standalone device is global, so it is built in its own process
+STANDALONE = """
+import sys
+import numpy as np
+import wcnet
+
+sim = wcnet.Simulator(0.5, N=3, standalone=sys.argv[1])
+runs = sim.runs([[1, 2, 3], [2, 2, 2]], 1, sigmas=0)
+np.save(sys.argv[2], np.array([E for I, E in runs]))
+"""
+
+
+def _stats(lfp, dt, burn=0.5):
+    """The mean, variance and PSD peak frequency of an ensemble's lfp."""
+    lfp = lfp[:, int(burn / dt):]
+    freqs, psds = welch(lfp, 1 / dt, nperseg=int(1 / dt))
+    psd = psds.mean(0)
+    m = freqs > 5
+
+    return lfp.mean(), lfp.var(), freqs[m][np.argmax(psd[m])]
+
+
+def test_deterministic():
+    # Without noise the two engines step the same equations
+    I, E = wc.ie(1, 2, 1, sigma=0)
+    Ib, Eb = wcnet.Simulator(1).run(2, 1, sigma=0)
+
+    assert np.allclose(E, Eb[0], rtol=0, atol=1e-12)
+    assert np.allclose(I, Ib[0], rtol=0, atol=1e-12)
+
+
+def test_noisy():
+    # With noise they draw different noise, so compare statistics
+    t, n, dt = 10, 10, 1e-3
+    I, E = wc.ensemble(t, 2, 1, dt=dt, sigmas=0.01, seeds=np.arange(n))
+    Ib, Eb = wcnet.Simulator(t, N=n, dt=dt).run(2, 1, sigma=0.01, seed=1)
+
+    mean, var, peak = _stats(E + I, dt)
+    mean_b, var_b, peak_b = _stats(Eb + Ib, dt)
+
+    assert abs(mean - mean_b) < 0.02 * abs(mean_b)
+    assert abs(var - var_b) < 0.1 * var_b
+    assert abs(peak - peak_b) <= 2
+
+
+def test_standalone_table(tmp_path):
+    # A parameter table for N > 1 populations, with scalar Q and sigma
+    out = str(tmp_path / 'E.npy')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    subprocess.check_call(
+        [sys.executable, '-c', STANDALONE, str(tmp_path / 'build'), out],
+        env=env, cwd=str(tmp_path))
+
+    Es = np.load(out)
+    for E, Ps in zip(Es, [[1, 2, 3], [2, 2, 2]]):
+        _, E_np = wc.ensemble(0.5, Ps, 1, sigmas=0)
+        assert np.allclose(E, E_np, rtol=0, atol=1e-12)
+
+
+def test_heun_order():
+    # Without noise, halving dt cuts Heun's error ~4 times, Euler's ~2
+    ref = wc.ie(0.05, 2, 1, dt=1e-6, sigma=0, method='heun')[1]
+
+    def error(dt, method):
+        E = wc.ie(0.05, 2, 1, dt=dt, sigma=0, method=method)[1]
+        return np.abs(E - ref[::int(np.round(dt / 1e-6))]).max()
+
+    assert error(1e-3, 'heun') / error(5e-4, 'heun') > 3.5
+    assert error(1e-3, 'euler') / error(5e-4, 'euler') < 2.5
+    assert error(1e-3, 'heun') < error(1e-3, 'euler') / 10
+
+
+def test_heun_brian2():
+    # Brian2's heun is Euler for additive noise, so it is not offered
+    import ie
+    with pytest.raises(ValueError):
+        ie.ie(0.1, 2, 1, backend='brian2', method='heun')
+
+
+def test_run_model():
+    # The models return their traces, whatever the options
+    import ie
+    import mixie
+    I, E = wc.ie(0.5, drives.Constant(2), 1, seed=1)
+
+    results = ie.ie(0.5, 2, 1, seed=1, backend='numpy')
+    assert np.array_equal(results['E'], E)
+    assert np.array_equal(results['lfp'], E + I)
+
+    results = mixie.ie(0.5, [2], [1], 1, seed=1, backend='numpy',
+                       nperseg=250, stride=2)
+    assert np.array_equal(results['E'], E[::2])
+    assert results['psd'].shape == results['freqs'].shape
+
+
+def test_run_model_burn():
+    # Both backends check the burn-in before they run
+    for backend in ('numpy', 'brian2'):
+        for burn in (-0.1, 0.5, 1):
+            with pytest.raises(ValueError):
+                wc.run_model(0.5, drives.Constant(2), 1, burn=burn,
+                             decimate=2, backend=backend)
@@ -1,4 +1,7 @@
 from __future__ import division, print_function
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
 import numpy as np
 from scipy.optimize import curve_fit
 
@@ -127,21 +130,133 @@ def detect_peaks(x,
         ind = np.delete(ind, np.where(dx < threshold)[0])
     # detect small peaks closer than minimum peak distance
     if ind.size and mpd > 1:
-        ind = ind[np.argsort(x[ind])][::-1]  # sort ind by peak height
-        idel = np.zeros(ind.size, dtype=bool)
-        for i in range(ind.size):
-            if not idel[i]:
-                # keep peaks with the same height if kpsh is True
-                idel = idel | (ind >= ind[i] - mpd) & (ind <= ind[i] + mpd) \
-                    & (x[ind[i]] > x[ind] if kpsh else True)
-                idel[i] = 0  # Keep current peak
-        # remove the small peaks and sort back the indices by their occurrence
-        ind = np.sort(ind[~idel])
+        ind = _min_distance(x, ind, mpd, kpsh)
 
     return ind
 
 
-def fit_gaussian(x, y, stdev0, **detect_pars):
+def detect_peaks_batch(X,
+                       mph=None,
+                       mpd=1,
+                       threshold=0,
+                       edge='rising',
+                       kpsh=False,
+                       valley=False):
+    """Detect peaks in each row of a 2D array.
+
+    A batched `detect_peaks`; all thresholds are applied to every row at
+    once. The peaks of each row are exactly those `detect_peaks` finds.
+
+    Parameters
+    ----------
+    X : 2D array_like
+        data, one series (e.g. a spectrum) per row.
+    mph, mpd, threshold, edge, kpsh, valley :
+        see `detect_peaks`.
+
+    Returns
+    -------
+    indptr : 1D array
+        row pointers, `(n_rows + 1,)`.
+    ind : 1D array
+        peak indices; the peaks of row `i` are
+        `ind[indptr[i]:indptr[i + 1]]`.
+
+    Examples
+    --------
+    >>> X = np.random.randn(1000, 200)
+    >>> indptr, ind = detect_peaks_batch(X, mph=0, mpd=20)
+    >>> ind[indptr[3]:indptr[4]]  # peaks in the 4th row
+    """
+
+    X = np.array(X, dtype='float64', ndmin=2)
+    n_rows, n = X.shape
+    if n < 3:
+        return np.zeros(n_rows + 1, dtype=int), np.array([], dtype=int)
+    if valley:
+        X = -X
+    # find indices of all peaks
+    dX = X[:, 1:] - X[:, :-1]
+    # handle NaN's
+    isnan = np.isnan(X)
+    X[isnan] = np.inf
+    dX[np.isnan(dX)] = np.inf
+    zeros = np.zeros((n_rows, 1))
+    right = np.hstack((dX, zeros))
+    left = np.hstack((zeros, dX))
+    peaks = np.zeros(X.shape, dtype=bool)
+    if not edge:
+        peaks |= (right < 0) & (left > 0)
+    else:
+        if edge.lower() in ['rising', 'both']:
+            peaks |= (right <= 0) & (left > 0)
+        if edge.lower() in ['falling', 'both']:
+            peaks |= (right < 0) & (left >= 0)
+    # NaN's and values close to NaN's cannot be peaks
+    near = isnan.copy()
+    near[:, 1:] |= isnan[:, :-1]
+    near[:, :-1] |= isnan[:, 1:]
+    peaks &= ~near
+    # first and last values of x cannot be peaks
+    peaks[:, 0] = False
+    peaks[:, -1] = False
+    # remove peaks < minimum peak height
+    if mph is not None:
+        peaks &= X >= mph
+    # remove peaks - neighbors < threshold
+    if threshold > 0:
+        with np.errstate(invalid='ignore'):
+            d = np.minimum(X - np.hstack((zeros, X[:, :-1])),
+                           X - np.hstack((X[:, 1:], zeros)))
+        peaks &= ~(d < threshold)
+
+    rows, ind = np.nonzero(peaks)
+    indptr = np.zeros(n_rows + 1, dtype=int)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n_rows))
+
+    # detect small peaks closer than minimum peak distance
+    if ind.size and mpd > 1:
+        kept = [
+            _min_distance(X[i], ind[indptr[i]:indptr[i + 1]], mpd, kpsh)
+            for i in range(n_rows)
+        ]
+        indptr[1:] = np.cumsum([k.size for k in kept])
+        ind = np.concatenate(kept)
+
+    return indptr, ind
+
+
+def _min_distance(x, ind, mpd, kpsh):
+    """Remove peaks within `mpd` of a higher peak.
+
+    Peaks are visited from highest to lowest, and each peak that is
+    still kept removes the smaller peaks around it. As `ind` is sorted,
+    those neighbors are a contiguous slice of `ind`, found by binary
+    search, so this costs O(P log P) for P peaks rather than O(P^2).
+    """
+    # sort peaks by height; ties are visited in the same order as
+    # ind[np.argsort(x[ind])][::-1]
+    order = np.argsort(x[ind])[::-1]
+
+    # neighbors of the ith peak are ind[lo[i]:hi[i]]
+    lo = np.searchsorted(ind, ind - mpd, side='left')
+    hi = np.searchsorted(ind, ind + mpd, side='right')
+
+    heights = x[ind]
+    idel = np.zeros(ind.size, dtype=bool)
+    for i in order:
+        if not idel[i]:
+            if kpsh:
+                # keep peaks with the same height
+                idel[lo[i]:hi[i]] |= heights[lo[i]:hi[i]] < heights[i]
+            else:
+                idel[lo[i]:hi[i]] = True
+            idel[i] = False  # Keep current peak
+
+    return ind[~idel]
+
+
+def fit_gaussian(x, y, stdev0, warm=None, **detect_pars):
     # -
     # First find peaks, then
     peaks = detect_peaks(y, **detect_pars)
@@ -149,6 +264,10 @@ def fit_gaussian(x, y, stdev0, **detect_pars):
     centers = x[peaks]
     powers = y[peaks]
 
+    # With no peaks there is nothing to fit
+    if peaks.size == 0:
+        return centers, powers, np.array([]), np.ones_like(y) * np.nan
+
     # fit Guassians to the found peaks, 
     # **opt only for stdevs**.
     # Note: closes centers and powers
@@ -159,21 +278,35 @@ def fit_gaussian(x, y, stdev0, **detect_pars):
         ------
         x : 1d array, list
             The data to fit
-        params : [(amp, width), ...]
-            The initial parameters. The length of parasms
-            defines the number of Guassians at the end.
+        params : [width, ...]
+            The widths, one per center. All Gaussians are
+            evaluated at once, as a (n_centers, len(x)) array.
+        """
+        u = (x - centers[:, None]) / np.asarray(params)[:, None]
+
+        return np.dot(powers, np.exp(-1 * u**2))
+
+    def jac(x, *params):
+        """The Jacobian of `gauss` with respect to the widths.
+
+        d/dw [a * exp(-((x - c) / w)**2)] = a * exp(-u**2) * 2 * u**2 / w
+        where u = (x - c) / w.
         """
-        y = np.zeros_like(x)
-        for i, (ctr, amp) in enumerate(zip(centers, powers)):
-            wid = params[i]
-            y += amp * np.exp(-1 * ((x - ctr) / wid)**2)
+        wid = np.asarray(params)[:, None]
+        u2 = ((x - centers[:, None]) / wid)**2
 
-        return y
+        return (powers[:, None] * np.exp(-1 * u2) * 2 * u2 / wid).T
 
+    # Start from stdev0, or if given the (centers, stdevs) of an
+    # earlier fit, from the stdev of the nearest earlier center
     p0 = np.ones_like(centers) * stdev0
+    cold = np.ones(centers.size, dtype=bool)
+    if warm is not None:
+        p0, cold = _warm_start(centers, p0, *warm)
 
     try:
-        popt, pcov = curve_fit(gauss, x, y, p0=p0, bounds=(0.01, 20))
+        popt, pcov = curve_fit(
+            gauss, x, y, p0=p0, jac=jac, bounds=(0.01, 20))
         stdevs = popt
 
         fit = gauss(x, *popt)
@@ -183,7 +316,146 @@ def fit_gaussian(x, y, stdev0, **detect_pars):
 
 # For unknown reasons curve_fit sometimes doesn't budge from
 # stdev0. This is not so useful, so we manually set those stdevs
-# to nan
-    stdevs[np.isclose(stdevs, stdev0)] = np.nan
+# to nan. A warm start can already be the optimum, so is kept.
+    stdevs[cold & np.isclose(stdevs, stdev0)] = np.nan
 
     return centers, powers, stdevs, fit
+
+
+def _warm_start(centers, p0, centers0, stdevs0):
+    """Seed p0 with the stdevs of the matching `centers0`.
+
+    Returns the new p0, and which of its entries were not seeded.
+    """
+    keep = np.isfinite(stdevs0)
+    centers0 = np.asarray(centers0)[keep]
+    stdevs0 = np.asarray(stdevs0)[keep]
+    if centers0.size == 0 or centers.size == 0:
+        return p0, np.ones(centers.size, dtype=bool)
+
+    # Match centers that are each other's nearest, so an earlier
+    # peak seeds at most one new peak. The rest keep p0.
+    dist = np.abs(centers[:, None] - centers0[None, :])
+    nearest = dist.argmin(1)
+    mutual = dist.argmin(0)[nearest] == np.arange(centers.size)
+
+    p0 = p0.copy()
+    p0[mutual] = stdevs0[nearest[mutual]]
+
+    # Stay inside curve_fit's bounds
+    return np.clip(p0, 0.01, 20), ~mutual
+
+
+def _pad(results, n):
+    """Stack fit_gaussian results, padding with NaN to the most peaks."""
+    n_spectra = len(results)
+    n_peaks = max([len(r[0]) for r in results] + [0])
+
+    centers, powers, stdevs = np.ones((3, n_spectra, n_peaks)) * np.nan
+    fits = np.ones((n_spectra, n)) * np.nan
+    for i, (c, p, s, f) in enumerate(results):
+        centers[i, :len(c)] = c
+        powers[i, :len(p)] = p
+        stdevs[i, :len(s)] = s
+        fits[i] = f
+
+    return centers, powers, stdevs, fits
+
+
+def _fit_gaussians(Y, x, stdev0, detect_pars):
+    return [fit_gaussian(x, y, stdev0, **detect_pars) for y in Y]
+
+
+def fit_gaussian_batch(x, Y, stdev0, n_jobs=None, chunksize=None,
+                       **detect_pars):
+    """Fit Gaussians to the peaks of many spectra, in parallel.
+
+    Parameters
+    ----------
+    x : 1D array
+        frequencies, shared by all spectra.
+    Y : 2D array
+        spectra, one per row.
+    stdev0 : number
+        initial width of every Gaussian.
+    n_jobs : {None, int}, optional (default = None)
+        number of worker processes; None uses all CPUs, and 1 fits
+        serially, without a pool.
+    chunksize : {None, int}, optional (default = None)
+        number of spectra sent to a worker at once; by default the
+        spectra are split into ~4 chunks per worker.
+    **detect_pars
+        passed to `detect_peaks`.
+
+    Returns
+    -------
+    centers, powers, stdevs : 2D arrays
+        `(n_spectra, max_peaks)`; rows with fewer peaks are padded with
+        NaN. As in `fit_gaussian`, stdevs are NaN when the fit failed
+        or did not move from `stdev0`.
+    fits : 2D array
+        the fitted curves, `(n_spectra, len(x))`.
+    """
+    Y = np.atleast_2d(Y)
+    n_spectra = Y.shape[0]
+
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    if chunksize is None:
+        chunksize = max(int(np.ceil(n_spectra / (4 * n_jobs))), 1)
+
+    if n_jobs == 1:
+        results = _fit_gaussians(Y, x, stdev0, detect_pars)
+    else:
+        pool = Pool(n_jobs)
+        try:
+            chunks = [
+                Y[i:i + chunksize] for i in range(0, n_spectra, chunksize)
+            ]
+            fit = partial(
+                _fit_gaussians, x=x, stdev0=stdev0, detect_pars=detect_pars)
+            results = [r for chunk in pool.map(fit, chunks) for r in chunk]
+        finally:
+            pool.close()
+            pool.join()
+
+    return _pad(results, len(x))
+
+
+def fit_gaussian_sweep(x, Y, stdev0, **detect_pars):
+    """Fit Gaussians to an ordered series of spectra, warm starting each
+    fit from the one before.
+
+    Neighboring spectra in a sweep (e.g. of drive, or coupling) are
+    nearly the same, so the width of each peak is seeded with the
+    fitted width of the nearest peak in the previous spectrum, rather
+    than `stdev0`. Spectra with no usable fit are skipped as seeds.
+
+    Parameters
+    ----------
+    x : 1D array
+        frequencies, shared by all spectra.
+    Y : 2D array
+        spectra, one per row, ordered along the sweep.
+    stdev0 : number
+        initial width of every Gaussian in the first fit.
+    **detect_pars
+        passed to `detect_peaks`.
+
+    Returns
+    -------
+    centers, powers, stdevs, fits : 2D arrays
+        as for `fit_gaussian_batch`. Only widths that were not warm
+        started are NaN when they did not move from `stdev0`; a warm
+        start can already be the optimum.
+    """
+    results = []
+    warm = None
+    for y in np.atleast_2d(Y):
+        r = fit_gaussian(x, y, stdev0, warm=warm, **detect_pars)
+        results.append(r)
+
+        if np.isfinite(r[2]).any():
+            warm = (r[0], r[2])
+
+    return _pad(results, len(x))
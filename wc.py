@@ -0,0 +1,659 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Wilcon-Cowan EI model, integrated directly in numpy.
+
+A Brian2-free engine for the `ie()` models. It uses the same
+equations, parameters and schemes as the Brian2 code, but skips code
+generation entirely.
+
+Populations are integrated as an ensemble: the state of `n_runs`
+independent populations is held in one `(n_runs, 2)` array and
+advanced together, so a whole parameter grid fits in one process.
+"""
+from __future__ import division, print_function
+
+import math
+
+import numpy as np
+from scipy.signal import cheby1, sosfilt, sosfilt_zi
+
+import rng
+import drives
+from jit import njit, prange, use_jit
+from spectral import OnlineWelch
+
+# Fixed parameters.
+re = 1.0
+ri = 0.5
+
+kn = 1.0
+k = 1.0
+
+tau_e = 5e-3
+tau_i = 10e-3
+
+# Offsets of the sigmoids
+off_e = 1 / (1 + np.exp(2 * 1.0))
+off_i = 1 / (1 + np.exp(2 * 2.5))
+
+# Integration schemes. The noise is additive, so both are strong order 1
+# in it, but Heun's deterministic part is order 2 (Euler's is order 1).
+# It costs two drift evaluations a step but allows a larger dt at the
+# same accuracy (see `bench_dt.py`). Brian2's own `heun` is Heun only
+# in the noise, so is Euler-Maruyama here, and the Brian2 backend only
+# runs 'euler'.
+METHODS = ('euler', 'heun')
+
+
+def _drift(E, I, P, Q, c1, c2, c3, c4):
+    """The deterministic part of dE/dt and dI/dt."""
+    dE = (-E + (1 - re * E) *
+          (1 / (1 + np.exp(-(k * c1 * E - k * c2 * I + k * P - 2))) - off_e)
+          ) / tau_e
+    dI = (-I + (1 - ri * I) *
+          (1 / (1 + np.exp(-2 * (kn * c3 * E - kn * c4 * I + kn * Q - 2.5)))
+           - off_i)) / tau_i
+
+    return dE, dI
+
+
+def _drives(Ps, n_runs, n_steps):
+    """Format Ps as a (n_runs, n_steps) drive.
+
+    Like a Brian2 TimedArray, the last value of a drive is held past
+    its end. Constant drives are a read only view, so take no memory.
+    """
+    Ps = np.broadcast_to(Ps, (n_runs, Ps.shape[1]))
+    if Ps.shape[1] == 1:
+        return np.broadcast_to(Ps, (n_runs, n_steps))
+
+    n = min(Ps.shape[1], n_steps)
+    pad = np.repeat(Ps[:, -1:], n_steps - n, axis=1)
+
+    return np.hstack([Ps[:, :n], pad])
+
+
+@njit(cache=True)
+def _f(e, i, p, q, c1, c2, c3, c4):
+    """`_drift`, for one population."""
+    de = (-e + (1 - re * e) * (1 / (1 + math.exp(-(
+        k * c1 * e - k * c2 * i + k * p - 2))) - off_e)) / tau_e
+    di = (-i + (1 - ri * i) * (1 / (1 + math.exp(-2 * (
+        kn * c3 * e - kn * c4 * i + kn * q - 2.5))) - off_i)) / tau_i
+
+    return de, di
+
+
+@njit(parallel=True, cache=True)
+def _block(y, P, Q, c1, c2, c3, c4, dt, noise, heun, E, I):
+    """Compiled steps, in parallel over runs.
+
+    The same step as in `_integrate`, with the state y, drive P (one
+    step longer than the block) and pre-drawn noise for one block; E
+    and I are filled in.
+    """
+    n_runs, n = E.shape
+    for r in prange(n_runs):
+        e = y[r, 0]
+        i = y[r, 1]
+        for j in range(n):
+            E[r, j] = e
+            I[r, j] = i
+
+            de, di = _f(e, i, P[r, j], Q[r], c1, c2, c3, c4)
+            if heun:
+                de1, di1 = _f(e + dt * de + noise[j, r, 0],
+                              i + dt * di + noise[j, r, 1], P[r, j + 1],
+                              Q[r], c1, c2, c3, c4)
+                de = (de + de1) / 2
+                di = (di + di1) / 2
+
+            e, i = (e + dt * de + noise[j, r, 0],
+                    i + dt * di + noise[j, r, 1])
+
+        y[r, 0] = e
+        y[r, 1] = i
+
+
+def _integrate(n_steps,
+               drive,
+               Qs,
+               c1,
+               c2,
+               c3,
+               c4,
+               dt,
+               sigmas,
+               streams,
+               chunk,
+               jit=False,
+               method='euler'):
+    """Integrate an ensemble, yielding (I, E) in blocks of `chunk` steps.
+
+    `drive(i0, n)` is the drive of every run for the block of steps at
+    i0, `(n_runs, n)`.
+    """
+    if method not in METHODS:
+        raise ValueError("method must be one of {}.".format(METHODS))
+    heun = method == 'heun'
+    n_runs = len(streams)
+
+    # Noise scale, per run and channel
+    scale = sigmas[:, None] * np.sqrt(dt / np.array([tau_e, tau_i]))
+
+    # State of every population, E in col 0, I in col 1
+    y = np.zeros((n_runs, 2))
+
+    for i0 in range(0, n_steps, chunk):
+        n = min(chunk, n_steps - i0)
+        # Heun's second stage needs the drive at the next step
+        P = drive(i0, n + 1)
+
+        # Draw noise for the whole block, one stream per run and channel
+        noise = np.array([[prng_e.standard_normal(n),
+                           prng_i.standard_normal(n)]
+                          for prng_e, prng_i in streams])
+        noise = np.ascontiguousarray(noise.transpose(2, 0, 1))
+        noise *= scale
+
+        E = np.zeros((n_runs, n))
+        I = np.zeros((n_runs, n))
+        if jit:
+            _block(y, np.ascontiguousarray(P), Qs, c1, c2, c3, c4, dt, noise,
+                   heun, E, I)
+            yield I, E
+            continue
+
+        for j in range(n):
+            # As in Brian2, the state is recorded before each step.
+            E[:, j] = y[:, 0]
+            I[:, j] = y[:, 1]
+
+            dE, dI = _drift(y[:, 0], y[:, 1], P[:, j], Qs, c1, c2, c3, c4)
+            if heun:
+                dE1, dI1 = _drift(y[:, 0] + dt * dE + noise[j, :, 0],
+                                  y[:, 1] + dt * dI + noise[j, :, 1],
+                                  P[:, j + 1], Qs, c1, c2, c3, c4)
+                dE = (dE + dE1) / 2
+                dI = (dI + dI1) / 2
+
+            y[:, 0] += dt * dE
+            y[:, 1] += dt * dI
+            y += noise[j]
+
+        yield I, E
+
+
+def _setup(t, Ps, Qs, dt, sigmas, seeds, pops):
+    """Check and format the arguments of `ensemble`, and make the
+    drive (see `_integrate`) and noise streams of each run."""
+    n_steps = int(np.round(t / dt))
+
+    # Drive objects are made a block at a time, as they are needed
+    if isinstance(Ps, (list, tuple)):
+        Ps = drives.Batch(Ps, t, dt)
+        n_drives = len(Ps)
+    else:
+        Ps = np.asarray(Ps, dtype='float64')
+        if Ps.ndim < 2:
+            Ps = Ps.reshape(-1, 1)
+        n_drives = Ps.shape[0]
+    Qs = np.atleast_1d(np.asarray(Qs, dtype='float64'))
+    sigmas = np.atleast_1d(np.asarray(sigmas, dtype='float64'))
+
+    try:
+        n_runs = np.broadcast(np.empty(n_drives), Qs, sigmas).size
+    except ValueError:
+        raise ValueError("Ps, Qs and sigmas must have the same len.")
+    if seeds is not None:
+        if n_runs == 1:
+            n_runs = len(seeds)
+        elif len(seeds) != n_runs:
+            raise ValueError("seeds must have a len of {}".format(n_runs))
+
+    if isinstance(Ps, drives.Batch):
+        def drive(i0, n):
+            return np.broadcast_to(Ps.block(i0, n), (n_runs, n))
+    else:
+        Ps = _drives(Ps, n_runs, n_steps + 1)
+
+        def drive(i0, n):
+            return Ps[:, i0:i0 + n]
+
+    Qs = np.ascontiguousarray(np.broadcast_to(Qs, (n_runs, )))
+    sigmas = np.broadcast_to(sigmas, (n_runs, ))
+
+    if seeds is None:
+        streams = [(np.random, np.random)] * n_runs
+    else:
+        if pops is None:
+            pops = np.zeros(n_runs, dtype=int)
+        if len(pops) != n_runs:
+            raise ValueError("pops must have a len of {}".format(n_runs))
+        streams = [(rng.stream(seed, pop, rng.E),
+                    rng.stream(seed, pop, rng.I))
+                   for seed, pop in zip(seeds, pops)]
+
+    return n_steps, drive, Qs, sigmas, streams
+
+
+def ensemble(t,
+             Ps,
+             Qs,
+             c1=15.0,
+             c2=15.0,
+             c3=15.0,
+             c4=3.0,
+             dt=1e-3,
+             sigmas=0.01,
+             seeds=None,
+             pops=None,
+             chunk=1000,
+             jit=None,
+             method='euler'):
+    """Simulate many independent Wilcon-Cowan EI populations at once.
+
+    Parameters
+    ----------
+    t : float
+        run time (s).
+    Ps : number, array or list
+        (scaled) E drive. Either one constant per run `(n_runs,)`, one
+        waveform per run `(n_runs, n_steps)`, or a list with a
+        `drives.Drive` (or a number or waveform) per run. Drives of
+        any kind can be mixed in one batch.
+    Qs : number or 1D array_like
+        I drive, per run.
+    c1, c2, c3, c4 : number, optional
+        E->E, I->E, E->I and I->I coupling.
+    dt : number, optional (default = 1e-3)
+        time resolution (s).
+    sigmas : number or 1D array_like, optional (default = 0.01)
+        population noise, per run.
+    seeds : {None, 1D array_like}, optional (default = None)
+        one random seed per run. The E and I noise of each run come
+        from their own `rng` streams, so a run's noise does not depend
+        on the other runs in the ensemble. None draws all noise from
+        the global `np.random` state.
+    pops : {None, 1D array_like}, optional (default = None)
+        the population number of each run, in its seed's streams. Runs
+        that share a seed (e.g. the populations of one `mixie` run) must
+        have different `pops`. None numbers all runs 0.
+    chunk : int, optional (default = 1000)
+        number of time steps to draw noise for at once.
+    jit : {None, bool}, optional (default = None)
+        integrate with a compiled numba kernel, in parallel over runs.
+        None uses it if numba is installed. Both paths use the same
+        noise, so give the same traces.
+    method : {'euler', 'heun'}, optional (default = 'euler')
+        integration scheme: Euler-Maruyama, or stochastic Heun. Both
+        use the same noise.
+
+    Returns
+    -------
+    I, E : 2D arrays
+        the I and E traces, `(n_runs, n_steps)`.
+    """
+    n_steps, drive, Qs, sigmas, streams = _setup(t, Ps, Qs, dt, sigmas,
+                                                 seeds, pops)
+
+    # -
+    Is, Es = [], []
+    for I, E in _integrate(n_steps, drive, Qs, c1, c2, c3, c4, dt, sigmas,
+                           streams, chunk, use_jit(jit), method):
+        Is.append(I)
+        Es.append(E)
+
+    return np.hstack(Is), np.hstack(Es)
+
+
+class Recorder(object):
+    """The traces of an ensemble, kept as they are integrated.
+
+    Parameters
+    ----------
+    record : sequence of str, optional (default = ('E', 'I', 'lfp'))
+        the traces to keep, any of E, I and lfp (E + I). If empty none
+        are kept.
+    stride : {None, int}, optional (default = None)
+        keep every `stride`th sample.
+    decimate : {None, int}, optional (default = None)
+        keep every `decimate`th sample, after an anti-aliasing filter.
+    dtype : str, optional (default = 'float64')
+        the dtype to keep the traces in (e.g. 'float32').
+
+    Notes
+    -----
+    As in `scipy.signal.decimate` the filter is an order 8 Chebyshev
+    type I low pass, at 0.8 of the new Nyquist frequency. It runs on
+    the stream, so it is causal rather than zero phase; it shifts the
+    phase of the traces, but not their power. It starts from its
+    steady state for the first sample, so there is no step transient.
+    """
+    TRACES = ('E', 'I', 'lfp')
+
+    def __init__(self, record=TRACES, stride=None, decimate=None,
+                 dtype='float64'):
+        if any(name not in self.TRACES for name in record):
+            raise ValueError("record must be in {}.".format(self.TRACES))
+        if stride is not None and decimate is not None:
+            raise ValueError("Use stride or decimate, not both.")
+        if stride is not None and stride < 1:
+            raise ValueError("stride must be >= 1.")
+        if decimate is not None and decimate < 1:
+            raise ValueError("decimate must be >= 1.")
+
+        self.record = tuple(record)
+        self.step = stride or decimate or 1
+        self.dtype = dtype
+
+        self.sos = None
+        if decimate is not None and decimate > 1:
+            self.sos = cheby1(8, 0.05, 0.8 / decimate, output='sos')
+
+        self.n = 0
+        self._zi = {}
+        self._blocks = {name: [] for name in self.record}
+
+    def update(self, I, E):
+        """Add a block of traces, `(n_runs, n)`."""
+        # Keep the samples on the step's global grid
+        j0 = -self.n % self.step
+        self.n += I.shape[-1]
+
+        for name in self.record:
+            x = dict(E=E, I=I)[name] if name != 'lfp' else E + I
+            if self.sos is not None:
+                if name not in self._zi:
+                    self._zi[name] = (sosfilt_zi(self.sos)[:, None, :] *
+                                      x[None, :, :1])
+                x, self._zi[name] = sosfilt(
+                    self.sos, x, axis=-1, zi=self._zi[name])
+
+            # A copy, so the block it came from can be freed
+            self._blocks[name].append(
+                x[:, j0::self.step].astype(self.dtype))
+
+        return self
+
+    def traces(self):
+        """The traces so far, each `(n_runs, n_samples)`."""
+        return {name: np.hstack(blocks)
+                for name, blocks in self._blocks.items() if blocks}
+
+
+def record(t,
+           Ps,
+           Qs,
+           c1=15.0,
+           c2=15.0,
+           c3=15.0,
+           c4=3.0,
+           dt=1e-3,
+           sigmas=0.01,
+           seeds=None,
+           pops=None,
+           recorder=None,
+           nperseg=None,
+           noverlap=None,
+           burn=0,
+           mean=False,
+           chunk=1000,
+           jit=None,
+           method='euler'):
+    """Simulate an ensemble, keeping only what is asked for.
+
+    The runs are integrated in blocks of `chunk` steps. Each block,
+    after the burn-in, is given to the `recorder` and, with `nperseg`,
+    its lfp (E + I) is added to an `OnlineWelch` estimate. Then it is
+    dropped, so memory grows only with the traces the recorder keeps.
+
+    Parameters
+    ----------
+    t, Ps, Qs, c1, c2, c3, c4, dt, sigmas, seeds, pops, chunk, jit, method
+        as for `ensemble`.
+    recorder : {None, Recorder}, optional (default = None)
+        keeps the traces; None keeps none.
+    nperseg : {None, int}, optional (default = None)
+        if given, the samples per Welch segment of the lfp's PSD, at
+        most the number of steps kept.
+    noverlap : {None, int}, optional (default = None)
+        samples shared by segments; None is nperseg // 2.
+    burn : number, optional (default = 0)
+        time (s) to drop from the start, i.e. the transient from the
+        initial state.
+    mean : bool, optional (default = False)
+        if True, the runs are the populations of one model (as in
+        `mixie`), and only their mean is kept.
+
+    Returns
+    -------
+    freqs : {None, 1D array}
+        frequency of each PSD bin (Hz).
+    psd : {None, 2D array}
+        the PSD of each run, `(n_runs, n_freqs)`, or 1D if `mean`.
+        None without `nperseg`.
+    """
+    n_steps, drive, Qs, sigmas, streams = _setup(t, Ps, Qs, dt, sigmas,
+                                                 seeds, pops)
+    n_burn = int(np.round(burn / dt))
+    if not 0 <= n_burn < n_steps:
+        raise ValueError("burn must be >= 0 and < t.")
+
+    # -
+    spec = None
+    if nperseg is not None:
+        # As scipy's welch, short runs are one (shorter) segment
+        spec = OnlineWelch(1 / dt, min(nperseg, n_steps - n_burn), noverlap)
+
+    i0 = 0
+    for I, E in _integrate(n_steps, drive, Qs, c1, c2, c3, c4, dt, sigmas,
+                           streams, chunk, use_jit(jit), method):
+        j0 = max(n_burn - i0, 0)
+        i0 += I.shape[1]
+        if j0 >= I.shape[1]:
+            continue
+        I, E = I[:, j0:], E[:, j0:]
+
+        if mean:
+            I = I.mean(0, keepdims=True)
+            E = E.mean(0, keepdims=True)
+        if spec is not None:
+            spec.update(E + I)
+        if recorder is not None:
+            recorder.update(I, E)
+
+    if spec is None:
+        return None, None
+
+    psd = spec.psd()
+    if mean:
+        psd = psd[0]
+
+    return spec.freqs, psd
+
+
+def ie(t,
+       P,
+       Q,
+       c1=15.0,
+       c2=15.0,
+       c3=15.0,
+       c4=3.0,
+       dt=1e-3,
+       sigma=0.01,
+       seed=None,
+       jit=None,
+       method='euler'):
+    """Simulate a single Wilcon-Cowan EI population.
+
+    Parameters
+    ----------
+    t : float
+        run time (s).
+    P : number, 1D array_like or Drive
+        (scaled) E drive, either constant or one value per time step,
+        or a `drives.Drive`.
+    Q : number
+        I drive.
+    c1, c2, c3, c4 : number, optional
+        E->E, I->E, E->I and I->I coupling.
+    dt : number, optional (default = 1e-3)
+        time resolution (s).
+    sigma : number, optional (default = 0.01)
+        population noise.
+    seed : {None, int}, optional (default = None)
+        random seed; None uses the global `np.random` state.
+    jit : {None, bool}, optional (default = None)
+    method : {'euler', 'heun'}, optional (default = 'euler')
+        see `ensemble`.
+
+    Returns
+    -------
+    I, E : 1D arrays
+        the I and E traces, one value per time step.
+    """
+    seeds = None if seed is None else [seed]
+    I, E = ensemble(
+        t, [P], Q, c1, c2, c3, c4, dt=dt, sigmas=sigma, seeds=seeds, jit=jit,
+        method=method)
+
+    return I[0], E[0]
+
+
+def run_model(t,
+              Ps,
+              Qs,
+              c1=15.0,
+              c2=15.0,
+              c3=15.0,
+              c4=3.0,
+              dt=1e-3,
+              sigma=0.01,
+              seed=None,
+              backend='brian2',
+              nperseg=None,
+              stride=None,
+              decimate=None,
+              traces=Recorder.TRACES,
+              burn=0,
+              dtype='float64',
+              method='euler'):
+    """Run one of the `ie()` models, on either backend.
+
+    Parameters
+    ----------
+    t : float
+        run time (s).
+    Ps : Drive or list
+        the model's drive to E, a `drives.Drive`, or a list of them
+        for a model of many populations (as in `mixie`), whose mean is
+        kept.
+    Qs : number or 1D array_like
+        I drive, for all or per population.
+    c1, c2, c3, c4 : number, optional
+        E->E, I->E, E->I and I->I coupling.
+    dt : number, optional (default = 1e-3)
+        time resolution (s).
+    sigma : number, optional (default = 0.01)
+        population noise.
+    seed : {None, int}, optional (default = None)
+        random seed. Each population has its own streams of it.
+    backend : {'brian2', 'numpy'}, optional (default = 'brian2')
+        the engine, `wcnet` or this module.
+    nperseg : {None, int}, optional (default = None)
+        if given, stream the run (numpy backend), keeping the PSD of
+        the lfp, with this many samples per Welch segment. Traces are
+        then kept only with a `stride` or `decimate`.
+    stride, decimate, dtype : optional
+        see `Recorder`.
+    traces : sequence of str, optional (default = ('E', 'I', 'lfp'))
+        the traces to keep (`Recorder`'s `record`).
+    burn : number, optional (default = 0)
+        time (s) to drop from the start.
+    method : {'euler', 'heun'}, optional (default = 'euler')
+        integration scheme; heun needs the numpy backend.
+
+    Returns
+    -------
+    results : dict
+        the traces kept, each 1D, and with `nperseg` the PSD of the
+        lfp, `freqs` and `psd`. How they were kept (`nperseg`,
+        `stride`, `decimate` and `burn`) is noted when not the default;
+        with a `stride` (or `decimate`), so is their sampling rate,
+        `fs` (Hz).
+    """
+    if isinstance(Ps, drives.Drive):
+        Ps = [Ps]
+    N = len(Ps)
+
+    n_burn = int(np.round(burn / dt))
+    if not 0 <= n_burn < int(np.round(t / dt)):
+        raise ValueError("burn must be >= 0 and < t.")
+
+    if nperseg is not None and stride is None and decimate is None:
+        traces = ()
+    recorder = Recorder(traces, stride=stride, decimate=decimate, dtype=dtype)
+
+    freqs, psd = None, None
+    if backend == 'numpy':
+        seeds, pops = None, None
+        if seed is not None:
+            seeds, pops = [seed] * N, np.arange(N)
+        freqs, psd = record(
+            t, Ps, Qs, c1, c2, c3, c4, dt=dt, sigmas=sigma, seeds=seeds,
+            pops=pops, recorder=recorder, nperseg=nperseg, burn=burn,
+            mean=True, method=method)
+
+    elif backend == 'brian2':
+        if nperseg is not None:
+            raise ValueError("nperseg (streaming) needs the numpy backend.")
+        if method != 'euler':
+            raise ValueError(
+                "method {} needs the numpy backend.".format(method))
+
+        # Brian2 is only needed for its backend
+        import wcnet
+
+        # All N populations are simulated at once, as one group
+        # where each neuron gets its own P and Q.
+        drive = not all(isinstance(P, drives.Constant) for P in Ps)
+        sim = wcnet.simulator(t, N, c1, c2, c3, c4, dt=dt, drive=drive)
+        I, E = sim.run(Ps, Qs, sigma, seed)
+
+        # Brian2 records every step; only what is kept is cut
+        recorder.update(I[:, n_burn:].mean(0, keepdims=True),
+                        E[:, n_burn:].mean(0, keepdims=True))
+
+    else:
+        raise ValueError("backend must be numpy or brian2.")
+
+    results = {name: x[0] for name, x in recorder.traces().items()}
+    if nperseg is not None:
+        results.update(freqs=freqs, psd=psd, nperseg=nperseg)
+    if recorder.step > 1:
+        results.update(stride=recorder.step, fs=1 / (dt * recorder.step))
+    if decimate is not None:
+        results['decimate'] = decimate
+    if burn > 0:
+        results['burn'] = burn
+
+    return results
+
+
+def cli_options(args):
+    """The backend and recording options shared by the `ie()` models'
+    command lines, from their docopt `args`, as keyword arguments of
+    `run_model`."""
+    options = dict(
+        backend=args['--backend'],
+        traces=tuple(args['--record'].split(',')),
+        burn=float(args['--burn']),
+        dtype='float32' if args['--float32'] else 'float64',
+        method=args['--method'])
+    for key, arg in (('nperseg', '--welch'), ('stride', '--stride'),
+                     ('decimate', '--decimate')):
+        options[key] = None if args[arg] is None else int(args[arg])
+
+    return options
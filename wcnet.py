@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------------------
+"""Wilson-Cowan EI populations in Brian2, built once and run many times.
+
+Building a Brian2 network (its equations, group and monitor) and
+generating its code costs far more than a short run. A `Simulator`
+builds the network once, for a run time, dt, coupling and number of
+populations, then runs it for any P, Q, sigma and seed:
+
+    sim = Simulator(3, N=10)
+    for P in Ps:
+        I, E = sim.run(P, Q)
+
+In Brian2's runtime mode the network is stored after it is built, and
+restored before each run. With `standalone`, it is compiled once as a
+C++ program, and each run just reruns that program with new values
+(`device.run(run_args=...)`).
+"""
+from __future__ import division, print_function
+
+import numpy as np
+
+import brian2
+from brian2 import (NeuronGroup, StateMonitor, Network, TimedArray,
+                    second, msecond, set_device, device)
+
+import rng
+import drives
+from drives import Drive
+from wc import _drives
+
+# As in the models, but with P, Q and sigma set per population.
+eqs = """
+dE/dt = -E/tau_e + ((1 - re * E) * (1 / (1 + exp(-(k * c1 * E - k * c2 * I+ k * {P} - 2))) - 1/(1 + exp(2*1.0)))) / tau_e + (sigma / tau_e**.5 * xi_e) : 1
+dI/dt = -I/tau_i + ((1 - ri * I) * (1 / (1 + exp(-2 * (kn * c3 * E - kn * c4 * I + kn * Q - 2.5))) - 1/(1 + exp(2*2.5)))) / tau_i + (sigma / tau_i**.5 * xi_i) : 1
+Q : 1 (constant)
+sigma : 1 (constant)
+"""
+
+_simulators = {}
+
+
+def _full(x, shape):
+    """x broadcast to `shape`, as a new C contiguous array (standalone
+    runs hash their values' buffers, so can't take broadcast views)."""
+    return np.ascontiguousarray(
+        np.broadcast_to(np.asarray(x, dtype='float64'), shape))
+
+
+class Simulator(object):
+    """A Brian2 Wilson-Cowan network, built once and run many times.
+
+    Parameters
+    ----------
+    t : float
+        run time (s).
+    N : int, optional (default = 1)
+        number of (independent) populations.
+    c1, c2, c3, c4 : number, optional
+        E->E, I->E, E->I and I->I coupling.
+    dt : number, optional (default = 1e-3)
+        time resolution (s).
+    drive : bool, optional (default = False)
+        if True, P is a waveform (a TimedArray) rather than a constant.
+    standalone : {None, str}, optional (default = None)
+        if given, compile the network with Brian2's `cpp_standalone`
+        device, in this directory.
+
+    Notes
+    -----
+    The standalone device is global, so a process can build only one
+    standalone Simulator, and no runtime one after it. Standalone runs
+    can't be seeded. Each rerun of the program draws new noise.
+    """
+
+    def __init__(self,
+                 t,
+                 N=1,
+                 c1=15.0,
+                 c2=15.0,
+                 c3=15.0,
+                 c4=3.0,
+                 dt=1e-3,
+                 drive=False,
+                 standalone=None):
+        self.t = t
+        self.N = N
+        self.dt = dt
+        self.drive = drive
+        self.standalone = standalone
+        self.n_steps = int(np.round(t / dt))
+
+        if standalone is not None:
+            set_device('cpp_standalone', build_on_run=False,
+                       directory=standalone)
+
+        namespace = dict(
+            re=1.0,
+            ri=0.5,
+            kn=1.0,
+            k=1.0,
+            tau_e=5 * msecond,
+            tau_i=10 * msecond,
+            c1=c1,
+            c2=c2,
+            c3=c3,
+            c4=c4)
+
+        # A drive is a TimedArray over (time, population), whose
+        # values are set in place before each run.
+        model = eqs.format(P='drive(t, i)' if drive else 'P')
+        if drive:
+            self._values = np.zeros((self.n_steps, N))
+            self._timed = TimedArray(self._values, dt=dt * second)
+            namespace['drive'] = self._timed
+        else:
+            model += "P : 1 (constant)\n"
+
+        self.pops = NeuronGroup(
+            N, model=model, namespace=namespace, dt=dt * second)
+        self.pops.E = 0
+        self.pops.I = 0
+
+        self.mon = StateMonitor(self.pops, ('E', 'I'), record=True)
+        self.net = Network(self.pops, self.mon)
+
+        if standalone is None:
+            self.net.store()
+        else:
+            self.net.run(t * second, namespace={})
+            device.build(run=False)
+
+    def _values_of(self, P):
+        """Format P as the drive's values, `(n_steps, N)`, or without a
+        drive as one constant per population, `(N,)`."""
+        if isinstance(P, Drive):
+            P = [P]
+        if isinstance(P, (list, tuple)):
+            P = drives.evaluate(P, self.t, self.dt)
+            if not self.drive:
+                if P.shape[1] > 1:
+                    raise ValueError("P must be constant, without a drive.")
+                P = P[:, 0]
+
+        P = np.asarray(P, dtype='float64')
+        if not self.drive:
+            return _full(P, (self.N, ))
+
+        if P.ndim < 2:
+            P = P.reshape(1, -1)
+
+        return np.ascontiguousarray(_drives(P, self.N, self.n_steps).T)
+
+    def run(self, P, Q, sigma=0.01, seed=None):
+        """Run the network.
+
+        Parameters
+        ----------
+        P : number, array_like, Drive or list
+            (scaled) E drive. Without `drive`, one constant for all, or
+            per population `(N,)`. With `drive`, one waveform for all
+            `(n_steps,)`, or per population `(N, n_steps)`; as in
+            `wc.ensemble`, a short waveform holds its last value. Or,
+            a `drives.Drive` for all, or a list of them (one per
+            population).
+        Q : number or 1D array_like
+            I drive, for all or per population.
+        sigma : number or 1D array_like, optional (default = 0.01)
+            population noise, for all or per population.
+        seed : {None, int}, optional (default = None)
+            random seed, for Brian2's generator (not in standalone).
+
+        Returns
+        -------
+        I, E : 2D arrays
+            the I and E traces, `(N, n_steps)`.
+        """
+        Q = _full(Q, (self.N, ))
+        sigma = _full(sigma, (self.N, ))
+        P = self._values_of(P)
+
+        if self.standalone is not None:
+            if seed is not None:
+                raise ValueError("standalone runs can't be seeded.")
+
+            run_args = {self.pops.Q: Q, self.pops.sigma: sigma}
+            if self.drive:
+                run_args[self._timed] = P
+            else:
+                run_args[self.pops.P] = P
+            device.run(run_args=run_args)
+
+        else:
+            self.net.restore()
+            self.pops.Q = Q
+            self.pops.sigma = sigma
+            if self.drive:
+                self._values[:] = P
+            else:
+                self.pops.P = P
+
+            if seed is not None:
+                brian2.seed(rng.int_seed(seed, 0, rng.BRIAN))
+            self.net.run(self.t * second, namespace={})
+
+        return np.array(self.mon.I), np.array(self.mon.E)
+
+    def runs(self, Ps, Qs, sigmas=0.01, seeds=None):
+        """Run the network for each row of a parameter table.
+
+        Parameters
+        ----------
+        Ps, Qs, sigmas : array_like
+            one row (of `run`'s P, Q and sigma) per run. Qs and sigmas
+            can also be one number, for all runs.
+        seeds : {None, 1D array_like}, optional (default = None)
+            one seed per run.
+
+        Yields
+        ------
+        I, E : 2D arrays
+            the traces of each run, in order.
+        """
+        n_runs = len(Ps)
+        if np.ndim(Qs) == 0:
+            Qs = [Qs] * n_runs
+        if np.ndim(sigmas) == 0:
+            sigmas = [sigmas] * n_runs
+        if seeds is None:
+            seeds = [None] * n_runs
+
+        for P, Q, sigma, seed in zip(Ps, Qs, sigmas, seeds):
+            yield self.run(P, Q, sigma, seed)
+
+
+def simulator(t, N=1, c1=15.0, c2=15.0, c3=15.0, c4=3.0, dt=1e-3,
+              drive=False):
+    """A runtime `Simulator`, shared by all calls with the same
+    arguments in this process (e.g. by all the runs of a sweep
+    worker)."""
+    key = (t, N, c1, c2, c3, c4, dt, drive)
+    if key not in _simulators:
+        _simulators[key] = Simulator(t, N, c1, c2, c3, c4, dt, drive)
+
+    return _simulators[key]